@@ -0,0 +1,168 @@
+import json
+import logging
+import struct
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+import msgpack
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+# Envelope: zero byte (never the first byte of a JSON document, so values written
+# before the envelope existed are still readable), format version, codec id, flags.
+HEADER = struct.Struct('>BBBB')
+ENVELOPE_VERSION = 1
+FLAG_ZLIB = 0x01
+
+UUID_EXT = 1
+
+
+def _default(value: Any) -> Any:
+    return jsonable_encoder(value)
+
+
+class JsonCodec:
+    id = 1
+    name = 'json'
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=_default)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    id = 2
+    name = 'msgpack'
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, ext_hook=self._ext_hook)
+
+    @staticmethod
+    def _default(value: Any) -> Any:
+        if isinstance(value, uuid.UUID):
+            return msgpack.ExtType(UUID_EXT, value.bytes)
+        return jsonable_encoder(value)
+
+    @staticmethod
+    def _ext_hook(code: int, data: bytes) -> Any:
+        if code == UUID_EXT:
+            return str(uuid.UUID(bytes=data))
+        return msgpack.ExtType(code, data)
+
+
+class RawCodec:
+    """Stores already rendered bytes, such as response bodies, untouched."""
+
+    id = 3
+    name = 'raw'
+
+    def dumps(self, value: bytes) -> bytes:
+        return value
+
+    def loads(self, data: bytes) -> bytes:
+        return bytes(data)
+
+
+CODECS = {codec.id: codec for codec in (JsonCodec, MsgpackCodec, RawCodec)}
+
+
+@dataclass
+class CodecStats:
+    encoded: int = 0
+    encode_seconds: float = 0.0
+    decoded: int = 0
+    decode_seconds: float = 0.0
+    compressed: int = 0
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.raw_bytes - self.stored_bytes
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'encoded': self.encoded,
+            'encode_avg_ms': self.encode_seconds * 1000 / max(self.encoded, 1),
+            'decoded': self.decoded,
+            'decode_avg_ms': self.decode_seconds * 1000 / max(self.decoded, 1),
+            'compressed': self.compressed,
+            'bytes_saved': self.bytes_saved,
+        }
+
+
+class Envelope:
+    """
+    Serializes cached values with the configured codec, compresses payloads
+    larger than ``compression_threshold`` bytes and prefixes them with a header
+    naming the codec, so that entries stay readable after the codec is changed.
+
+    The codec only applies to Python objects. Bytes, such as the response
+    bodies fetch_response and fetch_page cache, are already rendered and are
+    always stored as they are with RawCodec, whatever ``codec`` is.
+    """
+
+    def __init__(
+        self,
+        codec: str = 'json',
+        compression_threshold: int = 4096,
+        compression_level: int = 6,
+    ):
+        codecs = {codec.name: codec for codec in CODECS.values()}
+        self.codec = codecs[codec]()
+        self.raw = RawCodec()
+        self.decoders: dict[int, Any] = {self.codec.id: self.codec, self.raw.id: self.raw}
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        self.stats = CodecStats()
+
+    def encode(self, value: Any) -> bytes:
+        started = time.perf_counter()
+        codec = self.raw if isinstance(value, bytes) else self.codec
+        payload = codec.dumps(value)
+        raw_size = len(payload)
+        flags = 0
+        if raw_size >= self.compression_threshold:
+            compressed = zlib.compress(payload, self.compression_level)
+            if len(compressed) < raw_size:
+                payload = compressed
+                flags |= FLAG_ZLIB
+                self.stats.compressed += 1
+        data = HEADER.pack(0, ENVELOPE_VERSION, codec.id, flags) + payload
+        self.stats.encoded += 1
+        self.stats.encode_seconds += time.perf_counter() - started
+        self.stats.raw_bytes += raw_size
+        self.stats.stored_bytes += len(data)
+        return data
+
+    def decode(self, data: bytes) -> Any:
+        started = time.perf_counter()
+        if not data or data[0] != 0:
+            value = json.loads(data)
+        else:
+            _, version, codec_id, flags = HEADER.unpack_from(data)
+            if version != ENVELOPE_VERSION:
+                raise ValueError(f'Unsupported cache envelope version {version}')
+            payload = memoryview(data)[HEADER.size:]
+            if flags & FLAG_ZLIB:
+                payload = zlib.decompress(payload)
+            value = self._decoder(codec_id).loads(payload)
+        self.stats.decoded += 1
+        self.stats.decode_seconds += time.perf_counter() - started
+        return value
+
+    def _decoder(self, codec_id: int) -> Any:
+        decoder = self.decoders.get(codec_id)
+        if decoder is None:
+            decoder = self.decoders[codec_id] = CODECS[codec_id]()
+        return decoder
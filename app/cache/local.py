@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any, NamedTuple
+
+
+class LocalEntry(NamedTuple):
+    value: Any
+    size: int
+    expires_at: float
+    tags: tuple[str, ...]
+
+
+class LocalCache:
+    """
+    In-process LRU cache bounded by entry count and by the encoded size of the
+    stored values. Every entry also expires after ``ttl`` seconds, which caps
+    staleness when an invalidation message from another worker is lost.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: OrderedDict[str, LocalEntry] = OrderedDict()
+        self.tags: dict[str, set[str]] = {}
+        self.size = 0
+        # Counts the invalidations, so a reader can tell that one ran while it
+        # was reading from Redis.
+        self.generation = 0
+
+    def get(self, key: str) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry.value
+
+    def set(self, key: str, value: Any, size: int, tags: Iterable[str] = ()) -> None:
+        self._remove(key)
+        if size > self.max_bytes:
+            return
+        entry = LocalEntry(value, size, time.monotonic() + self.ttl, tuple(tags))
+        self.entries[key] = entry
+        self.size += size
+        for tag in entry.tags:
+            self.tags.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def invalidate(self, keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        self.generation += 1
+        for tag in tags:
+            for key in self.tags.pop(tag, ()):
+                self._remove(key)
+        for key in keys:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.entries.clear()
+        self.tags.clear()
+        self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        for tag in entry.tags:
+            members = self.tags.get(tag)
+            if members is None:
+                continue
+            members.discard(key)
+            if not members:
+                del self.tags[tag]
@@ -1,43 +1,581 @@
+import asyncio
+import hashlib
 import json
-from typing import Any
+import logging
+import math
+import random
+import struct
+import uuid
+from collections.abc import Iterable
+from typing import Any, NamedTuple
 
-from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
 
-import redis
+import redis.asyncio as redis
+from app.cache.codecs import Envelope
+from app.cache.local import LocalCache
 from app.config import Config
 
+logger = logging.getLogger(__name__)
+
 config = Config()
 redis_host = config.REDIS_HOST
 redis_port = config.REDIS_PORT
 
+TAG_PREFIX = 'tag:'
+LOCK_PREFIX = 'lock:'
+VERSION_PREFIX = 'ver:'
+
+# KEYS holds the tag sets first and the plain keys after them, ARGV[1] is the
+# number of tag sets. Members of every tag set are dropped together with the set.
+INVALIDATE_SCRIPT = """
+local tags = tonumber(ARGV[1])
+local removed = 0
+for i = 1, tags do
+    local members = redis.call('SMEMBERS', KEYS[i])
+    for j = 1, #members, 512 do
+        removed = removed + redis.call('DEL', unpack(members, j, math.min(j + 511, #members)))
+    end
+    redis.call('DEL', KEYS[i])
+end
+for i = tags + 1, #KEYS do
+    removed = removed + redis.call('DEL', KEYS[i])
+end
+return removed
+"""
+
+# Cached responses are length prefixed fields followed by the JSON body: the
+# ETag the body was rendered under and, for pages, the next cursor.
+FIELD_HEADER = struct.Struct('>H')
+
+# KEYS are version keys, ARGV[1] their TTL in seconds and ARGV[2] a token no
+# version was ever set to. A missing version is created from the token, so a
+# version lost to a flush, an eviction or its TTL never comes back as a value
+# an ETag was already built from.
+VERSIONS_SCRIPT = """
+local versions = {}
+for i, key in ipairs(KEYS) do
+    local version = redis.call('GET', key)
+    if not version then
+        version = ARGV[2] .. ':' .. i
+        redis.call('SET', key, version, 'EX', ARGV[1])
+    end
+    versions[i] = version
+end
+return versions
+"""
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class CachedBody(NamedTuple):
+    body: bytes | None
+    etag: str
+    next_cursor: str | None = None
+
 
 class Cache:
 
-    def __init__(self, redis_host: str, redis_port: int):
-        self.redis_client = redis.StrictRedis(host=redis_host, port=redis_port, db=0)
+    def __init__(
+        self,
+        redis_host: str,
+        redis_port: int,
+        max_connections: int = 50,
+        pool_timeout: float = 5.0,
+        socket_timeout: float = 5.0,
+        socket_connect_timeout: float = 5.0,
+        health_check_interval: int = 30,
+        local: LocalCache | None = None,
+        channel: str = 'cache-invalidation',
+        lock_ttl: int = 5000,
+        lock_wait: float = 5.0,
+        lock_poll_interval: float = 0.05,
+        ttl: dict[str, int] | None = None,
+        default_ttl: int = 300,
+        ttl_jitter: float = 0.1,
+        stale_while_revalidate: bool = False,
+        stale_ttl: int = 30,
+        version_ttl: int = 86400,
+        envelope: Envelope | None = None,
+    ):
+        self.pool = redis.BlockingConnectionPool(
+            host=redis_host,
+            port=redis_port,
+            db=0,
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            health_check_interval=health_check_interval,
+        )
+        self.redis_client = redis.Redis(connection_pool=self.pool)
+        self.invalidate_script = self.redis_client.register_script(INVALIDATE_SCRIPT)
+        self.release_lock_script = self.redis_client.register_script(
+            RELEASE_LOCK_SCRIPT
+        )
+        self.versions_script = self.redis_client.register_script(VERSIONS_SCRIPT)
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self.lock_poll_interval = lock_poll_interval
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.ttl = ttl or {}
+        self.default_ttl = default_ttl
+        self.ttl_jitter = ttl_jitter
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_ttl = stale_ttl
+        self.refreshing: dict[str, asyncio.Task] = {}
+        self.version_ttl = version_ttl
+        self.envelope = envelope or Envelope()
+        self.adapters: dict[Any, TypeAdapter] = {}
+        self.local = local
+        self.channel = channel
+        self.instance_id = uuid.uuid4().hex
+        self.listener: asyncio.Task | None = None
 
     async def get(self, key: str) -> Any:
-        cached_data = self.redis_client.get(key)
+        cached_data = await self.redis_client.get(key)
         if cached_data:
-            return cached_data.decode('utf-8')
+            return self.envelope.decode(cached_data)
         return None
 
-    async def set(self, key: str, value: Any) -> None:
-        self.redis_client.set(key, value)
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        tags: Iterable[str] = (),
+        namespace: str | None = None,
+    ) -> None:
+        await self._store(key, self.envelope.encode(value), tags, namespace)
+
+    async def _store(
+        self, key: str, data: bytes, tags: tuple[str, ...], namespace: str | None
+    ) -> None:
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(key, data, ex=self._expiry(namespace))
+            for tag in tags:
+                tag_key = f'{TAG_PREFIX}{tag}'
+                pipe.sadd(tag_key, key)
+                pipe.expire(tag_key, self.max_expiry)
+            await pipe.execute()
 
-    async def fetch(self, key: str, repository: Any, *args, **kwargs) -> Any:
-        cached = await self.get(key)
+    def _expiry(self, namespace: str | None) -> int:
+        ttl = self.ttl.get(namespace, self.default_ttl)
+        ttl = round(ttl * random.uniform(1 - self.ttl_jitter, 1 + self.ttl_jitter))
+        if self.stale_while_revalidate:
+            ttl += self.stale_ttl
+        return max(ttl, 1)
+
+    @property
+    def max_expiry(self) -> int:
+        ttl = max([self.default_ttl, *self.ttl.values()]) * (1 + self.ttl_jitter)
+        return math.ceil(ttl) + self.stale_ttl
+
+    async def fetch(
+        self,
+        key: str,
+        repository: Any,
+        *args,
+        tags: Iterable[str] = (),
+        namespace: str | None = None,
+        **kwargs,
+    ) -> Any:
+        tags = tuple(tags)
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+        if self.stale_while_revalidate:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                cached, ttl = await pipe.get(key).pttl(key).execute()
+            if cached and 0 <= ttl < self.stale_ttl * 1000:
+                self._revalidate(key, tags, namespace, repository, args, kwargs)
+        else:
+            cached = await self.redis_client.get(key)
         if cached:
-            return json.loads(cached)
-        data = await repository(*args, **kwargs)
-        value = jsonable_encoder(data)
-        await self.set(key, json.dumps(value))
-        return data
+            return self._hit(key, cached, tags)
+        return await self._load(key, tags, namespace, repository, *args, **kwargs)
+
+    async def fetch_response(
+        self,
+        key: str,
+        response_model: Any,
+        repository: Any,
+        *args,
+        tags: Iterable[str] = (),
+        namespace: str | None = None,
+        if_none_match: str | None = None,
+        **kwargs,
+    ) -> CachedBody:
+        """
+        Same as fetch, but caches the JSON body of ``response_model`` built from
+        the repository result. The body is validated once, when the entry is
+        filled, and hits are returned as ready to send bytes.
+
+        The ETag is derived from the versions of the entry tags, so when it
+        matches ``if_none_match`` no body is loaded at all. ``*`` only matches
+        once the body is loaded, as the repository raises for a missing item.
+        """
+        tags = tuple(tags)
+        etag = await self.etag(key, tags)
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            return CachedBody(None, etag)
+        adapter = self._adapter(response_model)
+
+        async def render(*args, **kwargs) -> bytes:
+            data = await repository(*args, **kwargs)
+            body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+            return pack_fields(etag.encode()) + body
+
+        (entry_etag,), body = await self._fetch_versioned(
+            key, etag, 1, render, *args, tags=tags, namespace=namespace, **kwargs
+        )
+        if if_none_match is not None and matches_any(if_none_match):
+            return CachedBody(None, entry_etag.decode())
+        return CachedBody(body, entry_etag.decode())
+
+    async def fetch_page(
+        self,
+        key: str,
+        response_model: Any,
+        repository: Any,
+        *args,
+        tags: Iterable[str] = (),
+        namespace: str | None = None,
+        if_none_match: str | None = None,
+        store: bool = True,
+        **kwargs,
+    ) -> CachedBody:
+        """
+        Same as fetch_response for a repository returning ``(items, next_cursor)``.
+        Every page is its own entry under the tags of the whole list, and the
+        cursor of the next page is cached along with the body. Items already
+        rendered to JSON bytes by the repository are cached as they are.
+
+        Pages that are not worth a cache entry are rendered without ``store``.
+        They still get an ETag, so conditional requests for them are answered
+        from the versions too.
+        """
+        tags = tuple(tags)
+        etag = await self.etag(key, tags)
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            return CachedBody(None, etag)
+        adapter = self._adapter(response_model)
+
+        async def render(*args, **kwargs) -> bytes:
+            items, next_cursor = await repository(*args, **kwargs)
+            if isinstance(items, bytes):
+                body = items
+            else:
+                body = adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+            return pack_fields(etag.encode(), (next_cursor or '').encode()) + body
+
+        if store:
+            (entry_etag, cursor), body = await self._fetch_versioned(
+                key, etag, 2, render, *args, tags=tags, namespace=namespace, **kwargs
+            )
+        else:
+            (entry_etag, cursor), body = unpack_fields(await render(*args, **kwargs), 2)
+        if if_none_match is not None and matches_any(if_none_match):
+            body = None
+        return CachedBody(body, entry_etag.decode(), cursor.decode() or None)
+
+    async def _fetch_versioned(
+        self,
+        key: str,
+        etag: str,
+        fields: int,
+        render: Any,
+        *args,
+        tags: tuple[str, ...],
+        namespace: str | None,
+        **kwargs,
+    ) -> tuple[list[bytes], bytes]:
+        """
+        Fetches a response entry and returns it with the ETag it was rendered
+        under, never with the current one: a write bumps the versions before
+        its invalidation deletes the entry, and a fill that read the database
+        before a write may store its body after the invalidation.
+
+        An entry rendered under other versions than ``etag`` is refilled, so
+        stale bodies, in Redis or in the local tier, are not served for long.
+        """
+        data = await self.fetch(key, render, *args, tags=tags, namespace=namespace, **kwargs)
+        values, body = unpack_fields(data, fields)
+        if values[0] != etag.encode():
+            data = await self._load(key, tags, namespace, render, *args, **kwargs)
+            values, body = unpack_fields(data, fields)
+        return values, body
+
+    def _adapter(self, response_model: Any) -> TypeAdapter:
+        adapter = self.adapters.get(response_model)
+        if adapter is None:
+            adapter = self.adapters[response_model] = TypeAdapter(response_model)
+        return adapter
+
+    async def etag(self, key: str, tags: Iterable[str]) -> str:
+        token = ','.join(await self._versions(tuple(tags)))
+        digest = hashlib.sha1(f'{key}|{token}'.encode()).hexdigest()
+        return f'"{digest[:20]}"'
+
+    async def _versions(self, tags: tuple[str, ...]) -> list[str]:
+        """
+        The versions of ``tags``. The local tier keeps them under their tag,
+        so the invalidation messages drop them along with the entries.
+        """
+        version_keys = [f'{VERSION_PREFIX}{tag}' for tag in tags]
+        if self.local is not None:
+            versions = [self.local.get(version_key) for version_key in version_keys]
+            if None not in versions:
+                return versions
+            generation = self.local.generation
+        versions = [
+            version.decode()
+            for version in await self.versions_script(
+                keys=version_keys, args=[self.version_ttl, uuid.uuid4().hex]
+            )
+        ]
+        # Versions read before an invalidation that arrived meanwhile may
+        # already be stale, they are not kept.
+        if self.local is not None and self.local.generation == generation:
+            for tag, version_key, version in zip(tags, version_keys, versions):
+                self.local.set(version_key, version, len(version), (tag,))
+        return versions
+
+    async def bump(self, tags: Iterable[str]) -> None:
+        tags = tuple(tags)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.set(f'{VERSION_PREFIX}{tag}', uuid.uuid4().hex, ex=self.version_ttl)
+            await pipe.execute()
+        if self.local is not None:
+            self.local.invalidate(tags=tags)
+            message = {'origin': self.instance_id, 'keys': [], 'tags': tags}
+            await self.redis_client.publish(self.channel, json.dumps(message))
+
+    def _hit(self, key: str, cached: bytes, tags: tuple[str, ...]) -> Any:
+        value = self.envelope.decode(cached)
+        if self.local is not None:
+            self.local.set(key, value, len(cached), tags)
+        return value
+
+    def _revalidate(
+        self,
+        key: str,
+        tags: tuple[str, ...],
+        namespace: str | None,
+        repository: Any,
+        args: tuple,
+        kwargs: dict,
+    ) -> None:
+        if key in self.inflight or key in self.refreshing:
+            return
+        task = asyncio.create_task(
+            self._refresh(key, tags, namespace, repository, *args, **kwargs)
+        )
+        self.refreshing[key] = task
+        task.add_done_callback(lambda _: self.refreshing.pop(key, None))
+
+    async def _refresh(
+        self,
+        key: str,
+        tags: tuple[str, ...],
+        namespace: str | None,
+        repository: Any,
+        *args,
+        **kwargs,
+    ) -> None:
+        try:
+            await self._fill(key, tags, namespace, False, repository, *args, **kwargs)
+        except Exception as error:
+            logger.warning('Background refresh of %s failed: %s', key, error)
+
+    async def _load(
+        self,
+        key: str,
+        tags: tuple[str, ...],
+        namespace: str | None,
+        repository: Any,
+        *args,
+        **kwargs,
+    ) -> Any:
+        future = self.inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            data = await self._fill(key, tags, namespace, True, repository, *args, **kwargs)
+        except Exception as error:
+            future.set_exception(error)
+            # Nobody may be waiting, keep asyncio from reporting a lost exception.
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            del self.inflight[key]
+
+    async def _fill(
+        self,
+        key: str,
+        tags: tuple[str, ...],
+        namespace: str | None,
+        wait: bool,
+        repository: Any,
+        *args,
+        **kwargs,
+    ) -> Any:
+        lock_key = f'{LOCK_PREFIX}{key}'
+        token = uuid.uuid4().hex
+        acquired = await self.redis_client.set(lock_key, token, nx=True, px=self.lock_ttl)
+        if not acquired:
+            if not wait:
+                return None
+            cached = await self._wait_for(key, lock_key)
+            if cached:
+                return self._hit(key, cached, tags)
+        try:
+            data = await repository(*args, **kwargs)
+            encoded = self.envelope.encode(data)
+            await self._store(key, encoded, tags, namespace)
+            if self.local is not None:
+                self.local.set(key, self.envelope.decode(encoded), len(encoded), tags)
+            return data
+        finally:
+            if acquired:
+                await self.release_lock_script(keys=[lock_key], args=[token])
+
+    async def _wait_for(self, key: str, lock_key: str) -> bytes | None:
+        deadline = asyncio.get_running_loop().time() + self.lock_wait
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(self.lock_poll_interval)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                cached, locked = await pipe.get(key).exists(lock_key).execute()
+            if cached:
+                return cached
+            if not locked:
+                return None
+        return None
+
+    async def invalidate(self, *keys: str, tags: Iterable[str] = ()) -> None:
+        tags = tuple(tags)
+        if not tags and not keys:
+            return
+        tag_keys = [f'{TAG_PREFIX}{tag}' for tag in tags]
+        if self.local is not None:
+            self.local.invalidate(keys, tags)
+        await self.invalidate_script(keys=[*tag_keys, *keys], args=[len(tag_keys)])
+        if self.local is not None:
+            message = {'origin': self.instance_id, 'keys': keys, 'tags': tags}
+            await self.redis_client.publish(self.channel, json.dumps(message))
+
+    async def flush(self) -> None:
+        await self.redis_client.flushall()
+        if self.local is not None:
+            self.local.clear()
+
+    async def start(self) -> None:
+        if self.local is not None and self.listener is None:
+            self.listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis_client.pubsub(
+                    ignore_subscribe_messages=True
+                ) as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # Invalidations published while we were not subscribed are lost.
+                    self.local.clear()
+                    while True:
+                        message = await pubsub.get_message(timeout=1.0)
+                        if message is None:
+                            continue
+                        payload = json.loads(message['data'])
+                        if payload['origin'] != self.instance_id:
+                            self.local.invalidate(payload['keys'], payload['tags'])
+            except redis.RedisError as error:
+                logger.warning('Cache invalidation listener failed: %s', error)
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        logger.info('Cache codec stats: %s', self.envelope.stats.as_dict())
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+        await self.redis_client.aclose()
+        await self.pool.disconnect()
+
+
+def pack_fields(*fields: bytes) -> bytes:
+    return b''.join(FIELD_HEADER.pack(len(field)) + field for field in fields)
+
+
+def unpack_fields(data: bytes, count: int) -> tuple[list[bytes], bytes]:
+    """The first ``count`` length prefixed fields of ``data`` and the rest of it."""
+    fields = []
+    position = 0
+    for _ in range(count):
+        (size,) = FIELD_HEADER.unpack_from(data, position)
+        position += FIELD_HEADER.size
+        fields.append(data[position:position + size])
+        position += size
+    return fields, data[position:]
+
+
+def matches_any(if_none_match: str) -> bool:
+    return if_none_match.strip() == '*'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """``*`` is left to the caller, it only matches a representation that exists."""
+    return any(
+        candidate.strip().removeprefix('W/') == etag
+        for candidate in if_none_match.split(',')
+    )
+
 
-    async def invalidate(self, *args: str) -> None:
-        for input in args:
-            for key in self.redis_client.keys(input):
-                self.redis_client.delete(key)
+def create_cache() -> Cache:
+    return Cache(
+        redis_host,
+        redis_port,
+        max_connections=config.REDIS_MAX_CONNECTIONS,
+        pool_timeout=config.REDIS_POOL_TIMEOUT,
+        socket_timeout=config.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=config.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=config.REDIS_HEALTH_CHECK_INTERVAL,
+        local=LocalCache(
+            config.CACHE_LOCAL_MAX_ENTRIES,
+            config.CACHE_LOCAL_MAX_BYTES,
+            config.CACHE_LOCAL_TTL,
+        )
+        if config.CACHE_LOCAL_ENABLED
+        else None,
+        channel=config.CACHE_INVALIDATION_CHANNEL,
+        lock_ttl=config.CACHE_LOCK_TTL,
+        lock_wait=config.CACHE_LOCK_WAIT,
+        lock_poll_interval=config.CACHE_LOCK_POLL_INTERVAL,
+        ttl=config.CACHE_TTL,
+        default_ttl=config.CACHE_DEFAULT_TTL,
+        ttl_jitter=config.CACHE_TTL_JITTER,
+        stale_while_revalidate=config.CACHE_STALE_WHILE_REVALIDATE,
+        stale_ttl=config.CACHE_STALE_TTL,
+        version_ttl=config.CACHE_VERSION_TTL,
+        envelope=Envelope(
+            config.CACHE_CODEC,
+            config.CACHE_COMPRESSION_THRESHOLD,
+            config.CACHE_COMPRESSION_LEVEL,
+        ),
+    )
 
 
-cache_instance = Cache(redis_host, redis_port)
+cache_instance = create_cache()
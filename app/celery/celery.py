@@ -1,184 +1,205 @@
-import hashlib
-import json
-import uuid
+import io
+import logging
+import time
+from collections.abc import Callable
 from datetime import timedelta
-from operator import mul
 from pathlib import Path
-from typing import Any
-
-import pandas as pd
-from celery import Celery
-from openpyxl import load_workbook
-from sqlalchemy import String, create_engine
-from sqlalchemy.dialects.postgresql import UUID
-
+from typing import IO, Any
+
+import redis
+from celery import Celery, chord
+from sqlalchemy import create_engine
+
+from app.celery.importer import (
+    ImportStats,
+    ImportValidationException,
+    create_staging_schema,
+    drop_staging_schema,
+    import_catalog,
+    load_shard,
+    publish_shards,
+)
+from app.celery.invalidation import catalog_tags, invalidate
+from app.celery.lease import Lease, LeaseLostException
+from app.celery.parser import parse_rows, read_rows
+from app.celery.shards import Shard, WorkbookChangedException, open_sheet, plan_shards, read_shard
+from app.celery.warmup import run_warm_cache
+from app.celery.watcher import ChangeDetector, FileSignature, Snapshot, file_signature
 from app.config import Config
 
+logger = logging.getLogger(__name__)
+
 config = Config()
 broker_url = config.BROKER_URL
 postgres_db = config.POSTGRES_URL
 
 engine = create_engine(postgres_db)
 
+redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT)
+
 celery_app = Celery()
 
 celery_app.conf.broker_url = broker_url
 
-celery_app.conf.result_backend = 'rpc://'
+# The rpc backend can not run chords, which the sharded import needs.
+celery_app.conf.result_backend = f'redis://{config.REDIS_HOST}:{config.REDIS_PORT}/1'
 
 celery_app.conf.broker_connection_retry_on_startup = True
 
 celery_app.conf.beat_schedule = {
     'update_database': {
         'task': 'app.celery.celery.update_database',
-        'schedule': timedelta(seconds=15),
+        'schedule': timedelta(seconds=config.IMPORT_POLL_INTERVAL),
     },
 }
 
-admin_file = Path('./app/admin/Menu.xlsx')
-hash_file = Path('./app/admin/hash')
-
-
-def calculate_file_hash() -> str:
-    with Path('./app/admin/Menu.xlsx').open('rb') as f:
-        hasher = hashlib.sha256()
-        while chunk := f.read(65536):
-            hasher.update(chunk)
-    return hasher.hexdigest()
-
-
-def read_hash() -> str:
-    with Path('./app/admin/hash').open('r') as f:
-        return f.read()
-
-
-def write_hash(hash_summ: str) -> None:
-    with Path('./app/admin/hash').open('w') as f:
-        f.write(hash_summ)
-
-
-def excel_to_json(
-    array: list[list],
-) -> tuple[
-    dict[str, dict[Any, Any]],
-    dict[str, dict[Any, Any]],
-    dict[str, dict[Any, Any]],
-]:
-    menu_json: dict[str, dict] = {'id': {}, 'title': {}, 'description': {}}
-    submenu_json: dict[str, dict] = {
-        'id': {},
-        'menu_id': {},
-        'title': {},
-        'description': {},
-    }
-    dish_json: dict[str, dict] = {
-        'id': {},
-        'submenu_id': {},
-        'title': {},
-        'description': {},
-        'price': {},
-        'discount': {},
-    }
-
-    menu_count, sub_count, dish_count = 0, 0, 0
-
-    current_menu_id = ''
-    current_sub_id = ''
-
-    for row in array:
-        if bool(row[0]) and bool(row[1]):
-            current_menu_id = str(uuid.UUID(int=row[0]))
-            menu_json['id'][menu_count] = current_menu_id
-            menu_json['title'][menu_count] = row[1]
-            menu_json['description'][menu_count] = row[2]
-            menu_count += 1
-
-        elif bool(row[0]) is False and bool(row[1]):
-            current_sub_id = str(uuid.UUID(int=row[1]))
-            submenu_json['id'][sub_count] = current_sub_id
-            submenu_json['menu_id'][sub_count] = current_menu_id
-            submenu_json['title'][sub_count] = row[2]
-            submenu_json['description'][sub_count] = row[3]
-            sub_count += 1
-
-        elif bool(row[0]) is False and bool(row[1]) is False:
-            dish_json['id'][dish_count] = str(uuid.UUID(int=row[2]))
-            dish_json['submenu_id'][dish_count] = current_sub_id
-            dish_json['title'][dish_count] = row[3]
-            dish_json['description'][dish_count] = row[4]
-            dish_json['price'][dish_count] = row[5]
-            dish_json['discount'][dish_count] = row[6]
-            dish_count += 1
-    return menu_json, submenu_json, dish_json
-
-
-def run_update_database(data: list) -> None:
-    count = 1
-    menus_data, submenus_data, dishes_data = excel_to_json(data)
-
-    for price, discount in zip(
-        dishes_data['price'].copy().values(), dishes_data['discount'].copy().values()
-    ):
-        price = int(price)
-        discount = int(discount)
-        dishes_data['price'][str(count)] = mul(price, discount) / 100
-        count += 1
-    del dishes_data['discount']
-    dish_df = pd.read_json(json.dumps(dishes_data))
-    dish_df.to_sql(
-        'dishes',
-        engine,
-        if_exists='replace',
-        index=False,
-        dtype={
-            'id': UUID(as_uuid=True),
-            'submenu_id': UUID(as_uuid=True),
-            'title': String,
-            'description': String,
-            'price': String,
-        },
-    )
+admin_file = Path(config.IMPORT_WORKBOOK)
+# Per worker process: the first poll of a process hashes the workbook once.
+detector = ChangeDetector(admin_file, config.IMPORT_DEBOUNCE)
 
-    submenu_df = pd.read_json(json.dumps(submenus_data))
-    submenu_df.to_sql(
-        'submenu',
-        engine,
-        if_exists='replace',
-        index=False,
-        dtype={
-            'id': UUID(as_uuid=True),
-            'menu_id': UUID(as_uuid=True),
-            'title': String,
-            'description': String,
-        },
-    )
+IMPORT_LOCK = 'import:lock'
+# Shared by all workers: hash, last_success, duration, rows, upserted,
+# deleted, and rejected_hash with error for the last refused workbook.
+IMPORT_STATE = 'import:state'
 
-    menu_df = pd.read_json(json.dumps(menus_data))
-    menu_df.to_sql(
-        'menu',
-        engine,
-        if_exists='replace',
-        index=False,
-        dtype={
-            'id': UUID(as_uuid=True),
-            'title': String,
-            'description': String,
-        },
-    )
+
+def read_state() -> dict[str, str]:
+    return {key.decode(): value.decode() for key, value in redis_client.hgetall(IMPORT_STATE).items()}
+
+
+def write_state(**fields: str | int | float) -> None:
+    redis_client.hset(IMPORT_STATE, mapping=fields)
+
+
+def run_update_database(workbook: Path | IO[bytes], lease: Lease) -> ImportStats:
+    return import_catalog(engine, parse_rows(read_rows(workbook), config.IMPORT_BATCH_SIZE), lease.ensure)
 
 
 @celery_app.task
 def update_database() -> None:
-    if Path(admin_file).exists():
-        new_hash = calculate_file_hash()
-        if not Path.exists(hash_file):
-            write_hash('22222')
-        old_hash = read_hash()
-        wb = load_workbook(admin_file)
-        sheet = wb.active
-        data = sheet.iter_rows(values_only=True)
-        if old_hash != new_hash:
-            run_update_database(data)
-            write_hash(new_hash)
-    else:
+    if not admin_file.exists():
         print('No excel file')
+        return
+    snapshot = detector.poll()
+    if snapshot is None:
+        return
+    # The bytes that were hashed are the bytes that are parsed: the workbook is
+    # read from the admin volume once, and a newer version is a new change.
+    workbook = io.BytesIO(snapshot.data)
+    lease = Lease(redis_client, IMPORT_LOCK, config.IMPORT_LOCK_TTL)
+    if not lease.acquire():
+        # Another worker is importing; the change is seen again on the next poll.
+        return
+    handed_over = False
+    try:
+        state = read_state()
+        if snapshot.hash in (state.get('hash'), state.get('rejected_hash')):
+            detector.accept(snapshot)
+            return
+        if config.IMPORT_SHARDS > 1:
+            try:
+                shards = plan_shards(open_sheet(workbook), config.IMPORT_SHARDS)
+            except ImportValidationException as error:
+                reject(snapshot.hash, error)
+                detector.accept(snapshot)
+                return
+            if len(shards) > 1:
+                # The shards and the publish step hold the lease from here on.
+                lease.stop()
+                start_sharded_import(shards, snapshot, lease.token)
+                handed_over = True
+                return
+        stats = record_import(snapshot.hash, run_update_database, workbook, lease)
+        detector.accept(snapshot)
+    finally:
+        if not handed_over:
+            lease.release()
+    after_import(stats)
+
+
+def start_sharded_import(shards: list[Shard], snapshot: Snapshot, token: str) -> None:
+    schema = create_staging_schema(engine)
+    logger.info('Importing %s in %d shards', admin_file, len(shards))
+    publish = publish_import.s(schema, snapshot.hash, token, time.time())
+    publish.on_error(abort_import.s(schema, snapshot.hash, token))
+    chord(
+        import_shard.s(str(admin_file), snapshot.signature, schema, shard, token) for shard in shards
+    )(publish)
+
+
+def record_import(new_hash: str, run: Callable[..., ImportStats], *args) -> ImportStats | None:
+    """Runs an import and records its outcome in the shared import state."""
+    try:
+        stats = run(*args)
+    except ImportValidationException as error:
+        reject(new_hash, error)
+        return None
+    write_state(
+        hash=new_hash,
+        last_success=time.time(),
+        duration=stats.seconds,
+        rows=stats.rows,
+        upserted=stats.upserted,
+        deleted=stats.deleted,
+    )
+    return stats
+
+
+def reject(new_hash: str, error: ImportValidationException) -> None:
+    # Nothing was published. The workbook is not parsed again until it changes.
+    logger.error('Workbook rejected: %s', error)
+    write_state(rejected_hash=new_hash, error=str(error))
+
+
+def after_import(stats: ImportStats | None) -> None:
+    if stats is not None and stats.changes:
+        invalidate(
+            redis_client,
+            catalog_tags(stats.changes),
+            config.CACHE_INVALIDATION_CHANNEL,
+            config.CACHE_VERSION_TTL,
+        )
+        warm_cache.delay()
+
+
+@celery_app.task
+def import_shard(path: str, signature: list[int], schema: str, shard: list[int], token: str) -> dict[str, int]:
+    lease = Lease(redis_client, IMPORT_LOCK, config.IMPORT_LOCK_TTL, token)
+    if not lease.adopt():
+        raise LeaseLostException(IMPORT_LOCK)
+    try:
+        # Shards read the workbook from disk, the offsets only hold for the
+        # version that was planned. A newer one is imported on the next poll.
+        if file_signature(Path(path)) != FileSignature(*signature):
+            raise WorkbookChangedException(path)
+        rows = read_shard(open_sheet(Path(path)), Shard(*shard))
+        return load_shard(engine, schema, parse_rows(rows, config.IMPORT_BATCH_SIZE))
+    finally:
+        lease.stop()
+
+
+@celery_app.task
+def publish_import(tables: list[dict[str, int]], schema: str, new_hash: str, token: str, started: float) -> None:
+    lease = Lease(redis_client, IMPORT_LOCK, config.IMPORT_LOCK_TTL, token)
+    if not lease.adopt():
+        drop_staging_schema(engine, schema)
+        raise LeaseLostException(IMPORT_LOCK)
+    try:
+        stats = record_import(new_hash, publish_shards, engine, schema, tables, started, lease.ensure)
+    finally:
+        lease.release()
+    after_import(stats)
+
+
+@celery_app.task
+def abort_import(request: Any, exc: Exception, traceback: Any, schema: str, new_hash: str, token: str) -> None:
+    logger.error('Sharded import failed in %s: %s', request.id, exc)
+    drop_staging_schema(engine, schema)
+    if isinstance(exc, ImportValidationException):
+        reject(new_hash, exc)
+    Lease(redis_client, IMPORT_LOCK, config.IMPORT_LOCK_TTL, token).release()
+
+
+@celery_app.task
+def warm_cache() -> int:
+    return run_warm_cache()
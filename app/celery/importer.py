@@ -0,0 +1,468 @@
+import logging
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple
+
+import psycopg2
+from sqlalchemy import Engine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Table:
+    name: str
+    columns: tuple[str, ...]
+    # Columns under a unique index, other than the id.
+    unique: tuple[str, ...] = ()
+
+    @property
+    def staging(self) -> str:
+        return f'{self.name}_staging'
+
+    @property
+    def delta(self) -> str:
+        return f'{self.name}_delta'
+
+    @property
+    def updatable(self) -> tuple[str, ...]:
+        return tuple(column for column in self.columns if column != 'id')
+
+
+class MenuRow(NamedTuple):
+    id: str
+    title: str
+    description: str
+
+
+class SubmenuRow(NamedTuple):
+    id: str
+    menu_id: str | None
+    title: str
+    description: str
+
+
+class DishRow(NamedTuple):
+    id: str
+    submenu_id: str | None
+    title: str
+    description: str
+    price: float
+
+
+MENU = Table('menu', MenuRow._fields)
+SUBMENU = Table('submenu', SubmenuRow._fields)
+DISHES = Table('dishes', DishRow._fields, unique=('title',))
+# Parents first, the order the rows have to be upserted in.
+TABLES = (MENU, SUBMENU, DISHES)
+STAGING_SCHEMA_PREFIX = 'catalog_import_'
+
+
+class Batch(NamedTuple):
+    table: Table
+    rows: Sequence[tuple]
+
+
+@dataclass
+class CatalogChanges:
+    """Rows an import inserted, updated or deleted, with the parents they had before and after."""
+
+    menus: set[str] = field(default_factory=set)
+    deleted_menus: set[str] = field(default_factory=set)
+    # (submenu id, menu id)
+    submenus: set[tuple[str, str]] = field(default_factory=set)
+    deleted_submenus: set[str] = field(default_factory=set)
+    # (dish id, submenu id, menu id)
+    dishes: set[tuple[str, str, str | None]] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.menus or self.submenus or self.dishes)
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    upserted: int = 0
+    deleted: int = 0
+    seconds: float = 0.0
+    tables: dict[str, int] = field(default_factory=dict)
+    changes: CatalogChanges = field(default_factory=CatalogChanges)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+# Both the staged (new) and the live (old) parents of every changed row, so a
+# row that moved is reported under both.
+AFFECTED_MENUS = """
+SELECT id, hash IS NULL FROM menu_delta
+"""
+AFFECTED_SUBMENUS = """
+SELECT staged.id, staged.menu_id, false
+FROM submenu_delta AS delta JOIN submenu_staging AS staged USING (id)
+UNION
+SELECT live.id, live.menu_id, delta.hash IS NULL
+FROM submenu_delta AS delta JOIN submenu AS live USING (id)
+"""
+AFFECTED_DISHES = """
+SELECT staged.id, staged.submenu_id, coalesce(staged_submenu.menu_id, live_submenu.menu_id)
+FROM dishes_delta AS delta JOIN dishes_staging AS staged USING (id)
+LEFT JOIN submenu_staging AS staged_submenu ON staged_submenu.id = staged.submenu_id
+LEFT JOIN submenu AS live_submenu ON live_submenu.id = staged.submenu_id
+UNION
+SELECT live.id, live.submenu_id, live_submenu.menu_id
+FROM dishes_delta AS delta JOIN dishes AS live USING (id)
+LEFT JOIN submenu AS live_submenu ON live_submenu.id = live.submenu_id
+"""
+
+
+# Each query returns the offending values, and the import is refused if any does.
+# A parent is there after the publish if the workbook has it, or if it is in
+# the database and the import does not delete it.
+VALIDATION_CHECKS = {
+    'submenus without a menu': """
+        SELECT staged.id FROM submenu_staging AS staged
+        WHERE NOT EXISTS (SELECT 1 FROM menu_staging AS parent WHERE parent.id = staged.menu_id)
+        AND NOT EXISTS (
+            SELECT 1 FROM menu AS parent WHERE parent.id = staged.menu_id
+            AND NOT EXISTS (SELECT 1 FROM menu_delta AS delta WHERE delta.id = parent.id AND delta.hash IS NULL)
+        )
+    """,
+    'dishes without a submenu': """
+        SELECT staged.id FROM dishes_staging AS staged
+        WHERE NOT EXISTS (SELECT 1 FROM submenu_staging AS parent WHERE parent.id = staged.submenu_id)
+        AND NOT EXISTS (
+            SELECT 1 FROM submenu AS parent WHERE parent.id = staged.submenu_id
+            AND NOT EXISTS (SELECT 1 FROM submenu_delta AS delta WHERE delta.id = parent.id AND delta.hash IS NULL)
+        )
+    """,
+    'dishes without a price': """
+        SELECT title FROM dishes_staging WHERE price IS NULL OR price = 'NaN'
+    """,
+    'duplicate dish titles': """
+        SELECT title FROM dishes_staging GROUP BY title HAVING count(*) > 1
+    """,
+    'dish titles taken by dishes created through the API': """
+        SELECT staged.title FROM dishes_staging AS staged
+        JOIN dishes AS live ON live.title = staged.title AND live.id <> staged.id
+        WHERE NOT EXISTS (SELECT 1 FROM dishes_staging AS other WHERE other.id = live.id)
+        AND NOT EXISTS (SELECT 1 FROM dishes_delta AS delta WHERE delta.id = live.id AND delta.hash IS NULL)
+    """,
+}
+VALIDATION_SAMPLE = 10
+
+
+class ImportValidationException(Exception):
+    pass
+
+
+def copy_value(value: Any) -> str:
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class CopyStream:
+    """
+    File-like object for ``COPY ... FROM STDIN`` that encodes the rows in the
+    COPY text format as they are read, so the rows are never held in memory
+    as one document.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]]):
+        self.lines: Iterator[bytes] = (
+            ('\t'.join(map(copy_value, row)) + '\n').encode() for row in rows
+        )
+        self.buffer = bytearray()
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        chunk = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return chunk
+
+
+def import_catalog(engine: Engine, batches: Iterable[Batch], guard: Callable[[], None] | None = None) -> ImportStats:
+    """
+    Applies the difference between the given batches and the previous import.
+
+    The batches are copied into temporary staging tables as they arrive, and
+    ``stage_delta`` compares them with the previous import, in a load
+    transaction that does not touch the real tables. Only the validation and
+    the write of the delta run in the publish transaction, see ``apply_staged``.
+    """
+    stats = ImportStats(tables={table.name: 0 for table in TABLES})
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        cursor = connection.connection.cursor()
+        try:
+            with connection.begin():
+                # The staging tables live until the end of the session, so the
+                # connection drops them before it goes back to the pool.
+                for table in TABLES:
+                    cursor.execute(f'CREATE TEMP TABLE {table.staging} (LIKE {table.name} INCLUDING DEFAULTS)')
+                copy_batches(cursor, batches, stats)
+                stage_delta(cursor)
+            with connection.begin():
+                apply_staged(cursor, stats, guard)
+        finally:
+            with connection.begin():
+                for table in TABLES:
+                    cursor.execute(f'DROP TABLE IF EXISTS {table.staging}, {table.delta}')
+    stats.seconds = time.perf_counter() - start
+    log_stats(stats)
+    return stats
+
+
+def create_staging_schema(engine: Engine) -> str:
+    """
+    Creates unlogged staging tables that the shards of one import load in
+    parallel, in a schema of their own. Schemas left by imports that never
+    finished are dropped, so this must run under the import lease.
+    """
+    schema = f'{STAGING_SCHEMA_PREFIX}{uuid.uuid4().hex}'
+    with engine.begin() as connection:
+        leftovers = connection.exec_driver_sql(
+            'SELECT nspname FROM pg_namespace WHERE starts_with(nspname, %(prefix)s)',
+            {'prefix': STAGING_SCHEMA_PREFIX},
+        ).scalars()
+        for leftover in leftovers.all():
+            connection.exec_driver_sql(f'DROP SCHEMA {leftover} CASCADE')
+        connection.exec_driver_sql(f'CREATE SCHEMA {schema}')
+        for table in TABLES:
+            connection.exec_driver_sql(
+                f'CREATE UNLOGGED TABLE {schema}.{table.staging} (LIKE {table.name} INCLUDING DEFAULTS)'
+            )
+    return schema
+
+
+def drop_staging_schema(engine: Engine, schema: str) -> None:
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+
+
+def load_shard(engine: Engine, schema: str, batches: Iterable[Batch]) -> dict[str, int]:
+    """Copies one shard into the staging tables of ``schema`` and returns the rows per table."""
+    stats = ImportStats(tables={table.name: 0 for table in TABLES})
+    with engine.begin() as connection:
+        cursor = connection.connection.cursor()
+        cursor.execute(f'SET LOCAL search_path TO {schema}, public')
+        copy_batches(cursor, batches, stats)
+    return stats.tables
+
+
+def publish_shards(
+    engine: Engine,
+    schema: str,
+    tables: Iterable[dict[str, int]],
+    started: float,
+    guard: Callable[[], None] | None = None,
+) -> ImportStats:
+    """Publishes what the shards loaded into ``schema``, then drops it."""
+    stats = ImportStats(tables={table.name: 0 for table in TABLES})
+    for shard in tables:
+        for name, rows in shard.items():
+            stats.tables[name] += rows
+            stats.rows += rows
+    try:
+        with engine.connect() as connection:
+            cursor = connection.connection.cursor()
+            try:
+                with connection.begin():
+                    cursor.execute(f'SET LOCAL search_path TO {schema}, public')
+                    stage_delta(cursor)
+                with connection.begin():
+                    cursor.execute(f'SET LOCAL search_path TO {schema}, public')
+                    apply_staged(cursor, stats, guard)
+            finally:
+                with connection.begin():
+                    for table in TABLES:
+                        cursor.execute(f'DROP TABLE IF EXISTS {table.delta}')
+    finally:
+        drop_staging_schema(engine, schema)
+    stats.seconds = time.time() - started
+    log_stats(stats)
+    return stats
+
+
+def log_stats(stats: ImportStats) -> None:
+    logger.info(
+        'Imported %d rows (%s) in %.3fs, %.0f rows/s: %d upserted, %d deleted',
+        stats.rows,
+        ', '.join(f'{name}: {count}' for name, count in stats.tables.items()),
+        stats.seconds,
+        stats.rows_per_second,
+        stats.upserted,
+        stats.deleted,
+    )
+
+
+def copy_batches(cursor: Any, batches: Iterable[Batch], stats: ImportStats) -> None:
+    for table, rows in batches:
+        try:
+            cursor.copy_expert(
+                f'COPY {table.staging} ({", ".join(table.columns)}) FROM STDIN',
+                CopyStream(rows),
+            )
+        except (psycopg2.DataError, psycopg2.IntegrityError) as error:
+            # Values of the workbook that do not fit the columns.
+            message = ' '.join(str(error).split())
+            raise ImportValidationException(f'{table.name} rows refused: {message}') from error
+        stats.tables[table.name] += cursor.rowcount
+        stats.rows += cursor.rowcount
+
+
+def stage_delta(cursor: Any) -> None:
+    """
+    Computes the delta of the staged catalog into temporary tables that live
+    until the end of the session, so the caller drops them.
+
+    The content hash of every staged row is compared with the hash recorded
+    for its id in import_rows by the previous import, which gives the rows to
+    upsert, and the recorded ids missing from the workbook give the rows to
+    delete; an imported row deleted through the API is staged again as well.
+    Rows created through the API are never in import_rows and are left alone.
+    """
+    for table in TABLES:
+        cursor.execute(f'ANALYZE {table.staging}')
+        # A NULL hash marks a row that is gone from the workbook.
+        cursor.execute(
+            f'CREATE TEMP TABLE {table.delta} AS '
+            f'SELECT staged.id, {content_hash(table)} AS hash FROM {table.staging} AS staged '
+            f'LEFT JOIN import_rows AS recorded '
+            f'ON recorded.table_name = %(table)s AND recorded.id = staged.id '
+            f'WHERE recorded.hash IS DISTINCT FROM {content_hash(table)} '
+            f'OR NOT EXISTS (SELECT 1 FROM {table.name} AS live WHERE live.id = staged.id) '
+            f'UNION ALL '
+            f'SELECT recorded.id, NULL FROM import_rows AS recorded '
+            f'WHERE recorded.table_name = %(table)s AND NOT EXISTS ('
+            f'SELECT 1 FROM {table.staging} AS staged WHERE staged.id = recorded.id)',
+            {'table': table.name},
+        )
+        cursor.execute(f'ANALYZE {table.delta}')
+
+
+def content_hash(table: Table) -> str:
+    return f'md5(ROW({", ".join(f"staged.{column}" for column in table.updatable)})::text)'
+
+
+def apply_staged(cursor: Any, stats: ImportStats, guard: Callable[[], None] | None = None) -> None:
+    """
+    Publishes the delta computed by ``stage_delta``, inside the caller's
+    transaction, so readers see either the old or the new catalog and the real
+    tables keep their keys, types, indexes and counter triggers.
+
+    The catalog tables are locked against writes first, readers are not
+    blocked. Staged rows deleted through the API since the delta was computed
+    are added to it, and the validation runs under the lock, so no write of
+    the API can break the publish before it commits.
+
+    ``guard`` runs last, before the caller commits, and rolls the publish
+    back by raising; the import lease is checked there.
+    """
+    cursor.execute(f'LOCK TABLE {", ".join(table.name for table in TABLES)} IN SHARE ROW EXCLUSIVE MODE')
+    for table in TABLES:
+        cursor.execute(
+            f'INSERT INTO {table.delta} (id, hash) '
+            f'SELECT staged.id, {content_hash(table)} FROM {table.staging} AS staged '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {table.name} AS live WHERE live.id = staged.id) '
+            f'AND NOT EXISTS (SELECT 1 FROM {table.delta} AS delta WHERE delta.id = staged.id)'
+        )
+    validate(cursor)
+    stats.changes = affected_rows(cursor)
+    publish(cursor, stats)
+    if guard is not None:
+        guard()
+
+
+def validate(cursor: Any) -> None:
+    """Checks the catalog the delta would publish, so a broken workbook changes nothing."""
+    problems = []
+    for check, query in VALIDATION_CHECKS.items():
+        cursor.execute(f'{query} LIMIT {VALIDATION_SAMPLE}')
+        values = [str(value) for value, in cursor.fetchall()]
+        if values:
+            problems.append(f'{check}: {", ".join(values)}')
+    if problems:
+        raise ImportValidationException('; '.join(problems))
+
+
+def publish(cursor: Any, stats: ImportStats) -> None:
+    # Stale rows go first, so a title that moved to another id does not
+    # collide with the row it is taken from.
+    for table in reversed(TABLES):
+        cursor.execute(
+            f'DELETE FROM {table.name} USING {table.delta} AS delta '
+            f'WHERE delta.id = {table.name}.id AND delta.hash IS NULL'
+        )
+        stats.deleted += cursor.rowcount
+    # The unique indexes are checked row by row, so values that move between
+    # rows are cleared first. Two dishes that swap titles would collide in the
+    # upsert otherwise; NULL never conflicts and the upsert sets the new value.
+    for table in TABLES:
+        for column in table.unique:
+            cursor.execute(
+                f'UPDATE {table.name} AS live SET {column} = NULL '
+                f'FROM {table.staging} AS staged JOIN {table.delta} AS delta USING (id) '
+                f'WHERE live.id = staged.id AND delta.hash IS NOT NULL '
+                f'AND live.{column} IS DISTINCT FROM staged.{column}'
+            )
+    for table in TABLES:
+        columns = ', '.join(table.columns)
+        assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in table.updatable)
+        current = ', '.join(f'{table.name}.{column}' for column in table.updatable)
+        excluded = ', '.join(f'EXCLUDED.{column}' for column in table.updatable)
+        cursor.execute(
+            f'INSERT INTO {table.name} ({columns}) '
+            f'SELECT {", ".join(f"staged.{column}" for column in table.columns)} '
+            f'FROM {table.staging} AS staged JOIN {table.delta} AS delta USING (id) '
+            f'WHERE delta.hash IS NOT NULL '
+            f'ON CONFLICT (id) DO UPDATE SET {assignments} '
+            f'WHERE ({current}) IS DISTINCT FROM ({excluded})'
+        )
+        stats.upserted += cursor.rowcount
+        cursor.execute(
+            f'DELETE FROM import_rows AS recorded USING {table.delta} AS delta '
+            f'WHERE recorded.table_name = %(table)s AND recorded.id = delta.id '
+            f'AND delta.hash IS NULL',
+            {'table': table.name},
+        )
+        cursor.execute(
+            f'INSERT INTO import_rows (table_name, id, hash) '
+            f'SELECT %(table)s, id, hash FROM {table.delta} WHERE hash IS NOT NULL '
+            f'ON CONFLICT (table_name, id) DO UPDATE SET hash = EXCLUDED.hash',
+            {'table': table.name},
+        )
+
+
+def affected_rows(cursor: Any) -> CatalogChanges:
+    changes = CatalogChanges()
+    cursor.execute(AFFECTED_MENUS)
+    for id, deleted in cursor.fetchall():
+        changes.menus.add(str(id))
+        if deleted:
+            changes.deleted_menus.add(str(id))
+    cursor.execute(AFFECTED_SUBMENUS)
+    for id, menu_id, deleted in cursor.fetchall():
+        changes.submenus.add((str(id), str(menu_id)))
+        if deleted:
+            changes.deleted_submenus.add(str(id))
+    cursor.execute(AFFECTED_DISHES)
+    for id, submenu_id, menu_id in cursor.fetchall():
+        changes.dishes.add((str(id), str(submenu_id), menu_id and str(menu_id)))
+    return changes
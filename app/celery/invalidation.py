@@ -0,0 +1,54 @@
+import json
+import uuid
+from collections.abc import Iterable
+
+import redis
+
+from app.cache.redis import INVALIDATE_SCRIPT, TAG_PREFIX, VERSION_PREFIX
+from app.celery.importer import CatalogChanges
+
+# Tags removed per INVALIDATE_SCRIPT call, so one call never blocks Redis for long.
+INVALIDATION_CHUNK = 1000
+IMPORT_ORIGIN = 'import'
+
+
+def catalog_tags(changes: CatalogChanges) -> set[str]:
+    """The cache tags the services would invalidate for the same changes made through the API."""
+    tags: set[str] = set()
+    if changes.menus:
+        tags.add('menus')
+    for menu_id in changes.menus:
+        tags.add(f'menu_{menu_id}')
+    for menu_id in changes.deleted_menus:
+        tags.add(f'menu_{menu_id}_tree')
+    for submenu_id, menu_id in changes.submenus:
+        tags.update((f'menu_{menu_id}_submenus', f'menu_{menu_id}', f'submenu_{submenu_id}'))
+    for submenu_id in changes.deleted_submenus:
+        tags.add(f'submenu_{submenu_id}_tree')
+    for dish_id, submenu_id, menu_id in changes.dishes:
+        tags.update((f'submenu_{submenu_id}_dishes', f'submenu_{submenu_id}', f'dish_{dish_id}'))
+        if menu_id is not None:
+            tags.update((f'menu_{menu_id}_submenus', f'menu_{menu_id}'))
+    return tags
+
+
+def invalidate(client: redis.Redis, tags: Iterable[str], channel: str, version_ttl: int) -> None:
+    """
+    Synchronous counterpart of ``Cache.invalidate`` followed by ``Cache.bump``
+    for workers that do not run an event loop.
+    """
+    tags = sorted(tags)
+    if not tags:
+        return
+    # Readers never pair a body with an ETag it was not rendered under, see
+    # Cache._fetch_versioned. Deleting the entries before the versions move
+    # keeps them from refilling entries that are about to be deleted.
+    script = client.register_script(INVALIDATE_SCRIPT)
+    for start in range(0, len(tags), INVALIDATION_CHUNK):
+        chunk = tags[start:start + INVALIDATION_CHUNK]
+        script(keys=[f'{TAG_PREFIX}{tag}' for tag in chunk], args=[len(chunk)])
+    with client.pipeline(transaction=False) as pipe:
+        for tag in tags:
+            pipe.set(f'{VERSION_PREFIX}{tag}', uuid.uuid4().hex, ex=version_ttl)
+        pipe.execute()
+    client.publish(channel, json.dumps({'origin': IMPORT_ORIGIN, 'keys': [], 'tags': tags}))
@@ -0,0 +1,95 @@
+import logging
+import threading
+import uuid
+
+import redis
+
+from app.cache.redis import RELEASE_LOCK_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class LeaseLostException(Exception):
+    pass
+
+
+class Lease:
+    """
+    Redis lock that expires unless its holder keeps extending it.
+
+    A worker that dies stops extending the lease, and the lock is free again
+    ``ttl`` seconds later. While the lease is held, a daemon thread extends it
+    every ``ttl / 3`` seconds. ``lost`` is set if the lease expired anyway,
+    for example because Redis was unreachable for a whole ``ttl``, and
+    ``ensure`` checks the lease before its holder commits anything.
+
+    A lease can be handed over to other processes by its ``token``: they
+    ``adopt`` it to keep it alive while they work, and the last one releases it.
+    """
+
+    def __init__(self, client: redis.Redis, key: str, ttl: float, token: str | None = None):
+        self.client = client
+        self.key = key
+        self.ttl_ms = int(ttl * 1000)
+        self.token = token or uuid.uuid4().hex
+        self.extend_script = client.register_script(EXTEND_LOCK_SCRIPT)
+        self.release_script = client.register_script(RELEASE_LOCK_SCRIPT)
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+        self.heartbeat: threading.Thread | None = None
+
+    def acquire(self) -> bool:
+        if not self.client.set(self.key, self.token, nx=True, px=self.ttl_ms):
+            return False
+        self._start()
+        return True
+
+    def adopt(self) -> bool:
+        """Takes over a lease acquired elsewhere, False if it has already expired."""
+        if not self.extend_script(keys=[self.key], args=[self.token, self.ttl_ms]):
+            return False
+        self._start()
+        return True
+
+    def stop(self) -> None:
+        """Stops extending the lease without releasing it, for the next holder to adopt."""
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+            self.heartbeat = None
+
+    def ensure(self) -> None:
+        """
+        Extends the lease once more, or raises LeaseLostException if it is no
+        longer held. Called right before the work it guards is committed.
+        """
+        if self.lost.is_set() or not self.extend_script(keys=[self.key], args=[self.token, self.ttl_ms]):
+            raise LeaseLostException(self.key)
+
+    def release(self) -> None:
+        self.stop()
+        self.release_script(keys=[self.key], args=[self.token])
+
+    def _start(self) -> None:
+        self.stopped.clear()
+        self.heartbeat = threading.Thread(target=self._extend, name=f'lease:{self.key}', daemon=True)
+        self.heartbeat.start()
+
+    def _extend(self) -> None:
+        while not self.stopped.wait(self.ttl_ms / 3000):
+            try:
+                extended = self.extend_script(keys=[self.key], args=[self.token, self.ttl_ms])
+            except redis.RedisError as error:
+                logger.warning('Can not extend %s: %s', self.key, error)
+                continue
+            if not extended:
+                logger.error('Lease %s expired while it was held', self.key)
+                self.lost.set()
+                return
@@ -0,0 +1,176 @@
+import uuid
+import zipfile
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any
+from xml.parsers import expat
+
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from app.celery.importer import (
+    DISHES,
+    MENU,
+    SUBMENU,
+    VALIDATION_SAMPLE,
+    Batch,
+    DishRow,
+    ImportValidationException,
+    MenuRow,
+    SubmenuRow,
+)
+
+
+def workbook_uuid(*path: int) -> str:
+    """
+    Workbook ids are positions inside the parent (every submenu numbers its dishes
+    from 1), so the id of a row is derived from its full path in the workbook.
+    The result is stable between imports and shaped as the UUID4 the API expects.
+    """
+    name_based = uuid.uuid5(uuid.NAMESPACE_OID, '.'.join(map(str, path)))
+    return str(uuid.UUID(bytes=name_based.bytes, version=4))
+
+
+def cast_numbers(values: Sequence[Any]) -> np.ndarray:
+    """Values as floats, NaN for the ones that are blank or not numbers."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    numbers = np.full(len(values), np.nan)
+    for index, value in enumerate(values):
+        try:
+            numbers[index] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return numbers
+
+
+@contextmanager
+def reading_workbook() -> Iterator[None]:
+    """Rejects the workbook when the file is damaged or is not a workbook at all."""
+    try:
+        yield
+    except (
+        zipfile.BadZipFile,
+        InvalidFileException,
+        KeyError,
+        IndexError,
+        StopIteration,
+        ValueError,
+        SyntaxError,
+        expat.ExpatError,
+    ) as error:
+        raise ImportValidationException(f'not a readable workbook: {error!r}') from error
+
+
+def read_rows(source: Path | IO[bytes]) -> Iterator[tuple]:
+    """Streams the values of the active sheet without loading the workbook."""
+    with reading_workbook():
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+
+class DishColumns:
+    """Dish fields collected column by column, so prices are computed per batch."""
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.submenu_ids: list[str | None] = []
+        self.titles: list[str] = []
+        self.descriptions: list[str] = []
+        self.prices: list[Any] = []
+        self.discounts: list[Any] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, id: str, submenu_id: str | None, row: Sequence[Any]) -> None:
+        self.ids.append(id)
+        self.submenu_ids.append(submenu_id)
+        self.titles.append(row[3])
+        self.descriptions.append(row[4])
+        self.prices.append(row[5])
+        self.discounts.append(row[6])
+
+    def batch(self) -> Batch:
+        # Same as int(price) * int(discount) / 100 for every dish.
+        prices = np.trunc(cast_numbers(self.prices))
+        discounts = np.trunc(cast_numbers(self.discounts))
+        final_prices = prices * discounts / 100
+        invalid = np.flatnonzero(~np.isfinite(final_prices))
+        if invalid.size:
+            titles = ', '.join(str(self.titles[index]) for index in invalid[:VALIDATION_SAMPLE])
+            raise ImportValidationException(f'dishes without a numeric price and discount: {titles}')
+        final_prices = final_prices.tolist()
+        return Batch(
+            DISHES,
+            list(
+                map(
+                    DishRow._make,
+                    zip(
+                        self.ids,
+                        self.submenu_ids,
+                        self.titles,
+                        self.descriptions,
+                        final_prices,
+                    ),
+                )
+            ),
+        )
+
+
+def parse_rows(rows: Iterable[Sequence[Any]], batch_size: int = 5000) -> Iterator[Batch]:
+    """
+    Turns the sheet rows into batches of menu, submenu and dish rows of at most
+    ``batch_size`` rows each. A menu row has its number and title in the first
+    two columns, a submenu row starts in the second column and a dish row in
+    the third. Dish prices are emitted with the discount applied.
+    """
+    menus: list[MenuRow] = []
+    submenus: list[SubmenuRow] = []
+    dishes = DishColumns()
+
+    # Rows before their first parent are staged without one, and validation
+    # refuses them.
+    current_menu_id: str | None = None
+    current_sub_id: str | None = None
+    menu_number = 0
+    sub_number = 0
+
+    for row in rows:
+        if not any(row):
+            continue
+        if bool(row[0]) and bool(row[1]):
+            menu_number = row[0]
+            current_menu_id = workbook_uuid(menu_number)
+            menus.append(MenuRow(current_menu_id, row[1], row[2]))
+            if len(menus) >= batch_size:
+                yield Batch(MENU, menus)
+                menus = []
+
+        elif bool(row[0]) is False and bool(row[1]):
+            sub_number = row[1]
+            current_sub_id = workbook_uuid(menu_number, sub_number)
+            submenus.append(SubmenuRow(current_sub_id, current_menu_id, row[2], row[3]))
+            if len(submenus) >= batch_size:
+                yield Batch(SUBMENU, submenus)
+                submenus = []
+
+        elif bool(row[0]) is False and bool(row[1]) is False:
+            dishes.append(workbook_uuid(menu_number, sub_number, row[2]), current_sub_id, row)
+            if len(dishes) >= batch_size:
+                yield dishes.batch()
+                dishes = DishColumns()
+
+    if menus:
+        yield Batch(MENU, menus)
+    if submenus:
+        yield Batch(SUBMENU, submenus)
+    if dishes:
+        yield dishes.batch()
@@ -0,0 +1,218 @@
+import bisect
+import posixpath
+import re
+import zipfile
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import IO, Any, NamedTuple
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+from openpyxl.reader.strings import read_string_table
+
+from app.celery.parser import reading_workbook
+
+CHUNK_SIZE = 1024 * 1024
+# Longest match that can straddle two chunks: a row tag followed by a cell tag.
+OVERLAP = 4096
+# A non-empty cell in column A starts a row that parse_rows reads as a menu.
+# Shards start at these rows, so every shard starts with the menu its
+# submenus and dishes belong to.
+MENU_CELL = re.compile(rb'<(?:\w+:)?c r="A\d+"[^>]*(?<!/)>')
+ROW = re.compile(rb'<(?:\w+:)?row\b')
+SHEET_DATA_END = re.compile(rb'</(?:\w+:)?sheetData>')
+# parse_rows reads the first seven columns.
+ROW_WIDTH = 7
+
+
+class WorkbookChangedException(Exception):
+    pass
+
+
+class Sheet(NamedTuple):
+    # A path, or the workbook already read into memory.
+    source: str | Path | IO[bytes]
+    member: str
+    shared_strings: Sequence[str]
+
+
+class Shard(NamedTuple):
+    """Byte range of the uncompressed sheet XML holding whole menus."""
+
+    start: int
+    end: int
+
+
+def _local_name(tag: str) -> str:
+    return tag.rpartition('}')[2]
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> list[dict[str, str]]:
+    """Relationships of an OPC part, with their targets resolved to archive member names."""
+    directory, name = posixpath.split(part)
+    root = ElementTree.fromstring(archive.read(posixpath.join(directory, '_rels', f'{name}.rels')))
+    relationships = []
+    for element in root:
+        target = element.get('Target', '')
+        member = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(directory, target))
+        relationships.append({'id': element.get('Id', ''), 'type': element.get('Type', ''), 'member': member})
+    return relationships
+
+
+def open_sheet(source: str | Path | IO[bytes]) -> Sheet:
+    """
+    Finds the XML part of the active sheet, the one read_rows reads. The
+    package relationships are read directly: openpyxl parses a whole sheet
+    that has no dimension element just to open it.
+    """
+    with reading_workbook(), zipfile.ZipFile(source) as archive:
+        workbook_part = next(
+            relationship['member']
+            for relationship in _relationships(archive, '')
+            if relationship['type'].endswith('/officeDocument')
+        )
+        relationships = _relationships(archive, workbook_part)
+        workbook = ElementTree.fromstring(archive.read(workbook_part))
+        views = [element for element in workbook.iter() if _local_name(element.tag) == 'workbookView']
+        active = int(views[0].get('activeTab', 0)) if views else 0
+        sheets = [element for element in workbook.iter() if _local_name(element.tag) == 'sheet']
+        sheet_id = next(value for key, value in sheets[active].attrib.items() if _local_name(key) == 'id')
+        member = next(relationship['member'] for relationship in relationships if relationship['id'] == sheet_id)
+        shared_strings: list[str] = []
+        for relationship in relationships:
+            if relationship['type'].endswith('/sharedStrings'):
+                with archive.open(relationship['member']) as strings:
+                    shared_strings = read_string_table(strings)
+    return Sheet(source, member, shared_strings)
+
+
+def plan_shards(sheet: Sheet, shards: int) -> list[Shard]:
+    """
+    Splits the rows of the sheet into at most ``shards`` ranges of about the
+    same size, each starting at a menu row. Only the sheet XML is scanned,
+    which is much cheaper than parsing it.
+    """
+    menu_rows: list[int] = []
+    data_start = data_end = None
+    position = 0
+    tail = b''
+    with reading_workbook(), zipfile.ZipFile(sheet.source) as archive, archive.open(sheet.member) as source:
+        while chunk := source.read(CHUNK_SIZE):
+            buffer = tail + chunk
+            base = position - len(tail)
+            for match in MENU_CELL.finditer(buffer):
+                # Only the first cell of its row.
+                row_start = buffer.rfind(b'<', 0, match.start())
+                if row_start < 0 or not ROW.match(buffer, row_start):
+                    continue
+                offset = base + row_start
+                if not menu_rows or offset > menu_rows[-1]:
+                    menu_rows.append(offset)
+            if data_start is None and (match := ROW.search(buffer)):
+                data_start = base + match.start()
+            if data_end is None and b'sheetData>' in buffer and (match := SHEET_DATA_END.search(buffer)):
+                data_end = base + match.start()
+            tail = buffer[-OVERLAP:]
+            position += len(chunk)
+    if data_start is None or data_end is None:
+        return []
+    boundaries = [data_start]
+    for number in range(1, shards):
+        target = data_start + (data_end - data_start) * number // shards
+        index = bisect.bisect_left(menu_rows, target)
+        if index < len(menu_rows) and menu_rows[index] > boundaries[-1]:
+            boundaries.append(menu_rows[index])
+    boundaries.append(data_end)
+    return [Shard(start, end) for start, end in zip(boundaries, boundaries[1:])]
+
+
+def cast_number(value: str) -> int | float:
+    # Same rule as openpyxl, so both readers give the same ids and prices.
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+def column_index(reference: str) -> int:
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+class RowReader:
+    """expat handlers that turn ``<row>`` elements into tuples of cell values."""
+
+    def __init__(self, shared_strings: Sequence[str]):
+        self.shared_strings = shared_strings
+        self.rows: list[tuple] = []
+        self.row: list[Any] = []
+        self.column = 0
+        self.type = 'n'
+        self.text: list[str] = []
+        self.capture = False
+
+    def start(self, name: str, attributes: dict[str, str]) -> None:
+        name = name.rpartition(':')[2]
+        if name == 'row':
+            self.row = []
+        elif name == 'c':
+            reference = attributes.get('r')
+            self.column = column_index(reference) if reference else len(self.row)
+            self.type = attributes.get('t', 'n')
+            self.text = []
+        elif name in ('v', 't'):
+            self.capture = True
+
+    def end(self, name: str) -> None:
+        name = name.rpartition(':')[2]
+        if name in ('v', 't'):
+            self.capture = False
+        elif name == 'c':
+            if self.column >= len(self.row):
+                self.row.extend([None] * (self.column + 1 - len(self.row)))
+            self.row[self.column] = self.value()
+        elif name == 'row':
+            if len(self.row) < ROW_WIDTH:
+                self.row.extend([None] * (ROW_WIDTH - len(self.row)))
+            self.rows.append(tuple(self.row))
+
+    def characters(self, data: str) -> None:
+        if self.capture:
+            self.text.append(data)
+
+    def value(self) -> Any:
+        if not self.text:
+            return None
+        text = ''.join(self.text)
+        if self.type == 'n':
+            return cast_number(text)
+        if self.type == 's':
+            return self.shared_strings[int(text)]
+        if self.type == 'b':
+            return bool(int(text))
+        return text
+
+
+def read_shard(sheet: Sheet, shard: Shard) -> Iterator[tuple]:
+    """Streams the values of the rows in ``shard``, like read_rows does for the whole sheet."""
+    reader = RowReader(sheet.shared_strings)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = reader.start
+    parser.EndElementHandler = reader.end
+    parser.CharacterDataHandler = reader.characters
+    with reading_workbook():
+        parser.Parse(b'<sheetData>', False)
+        with zipfile.ZipFile(sheet.source) as archive, archive.open(sheet.member) as source:
+            source.seek(shard.start)
+            remaining = shard.end - shard.start
+            while remaining > 0 and (chunk := source.read(min(CHUNK_SIZE, remaining))):
+                remaining -= len(chunk)
+                parser.Parse(chunk, False)
+                yield from reader.rows
+                reader.rows.clear()
+        parser.Parse(b'</sheetData>', True)
+        yield from reader.rows
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.cache.redis import create_cache
+from app.config import Config
+from app.database.models import Menu, Submenu
+from app.repository.dishes_repo import DishesRepository
+from app.repository.menu_repo import MenuRepository
+from app.repository.submenu_repo import SubmenuRepositary
+from app.services.dish import DishesService
+from app.services.menu import MenuService
+from app.services.submenu import SubmenuService
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+
+
+async def warm_cache(concurrency: int, limit: int) -> int:
+    """
+    Fills the keys the API reads first: the first page of the menu list, every
+    menu with its counters, and the first page of every submenu and dish list.
+
+    The keys go through the services, so they are stored exactly as a request
+    would store them, and keys that are already cached are only read. The
+    worker runs every task in a new event loop, so the engine and the Redis
+    pool are created here and closed at the end.
+    """
+    engine = create_async_engine(config.ENGINE_URL, pool_size=concurrency, max_overflow=0)
+    session = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    cache = create_cache()
+    menus = MenuService(MenuRepository(session))
+    submenus = SubmenuService(SubmenuRepositary(session))
+    dishes = DishesService(DishesRepository(session))
+    for service in (menus, submenus, dishes):
+        service.cache = cache
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(fetch: Callable[..., Awaitable], *args) -> None:
+        async with semaphore:
+            await fetch(*args)
+
+    try:
+        async with session() as db_session:
+            menu_ids = (await db_session.scalars(select(Menu.id))).all()
+            submenu_ids = (await db_session.execute(select(Submenu.menu_id, Submenu.id))).all()
+        keys = [
+            warm(menus.get_menu_list, limit),
+            *(warm(menus.get, menu_id) for menu_id in menu_ids),
+            *(warm(submenus.get_submenu_list, menu_id, limit) for menu_id in menu_ids),
+            *(warm(dishes.get_dishes_list, menu_id, submenu_id, limit) for menu_id, submenu_id in submenu_ids),
+        ]
+        await asyncio.gather(*keys)
+        return len(keys)
+    finally:
+        await cache.close()
+        await engine.dispose()
+
+
+def run_warm_cache() -> int:
+    start = time.perf_counter()
+    keys = asyncio.run(warm_cache(config.CACHE_WARMUP_CONCURRENCY, config.PAGE_DEFAULT_LIMIT))
+    logger.info('Warmed %d cache keys in %.3fs', keys, time.perf_counter() - start)
+    return keys
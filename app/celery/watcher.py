@@ -0,0 +1,155 @@
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import select
+import struct
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+# Editors and copy tools often write a temporary file and rename it over the
+# workbook, so the directory is watched, not the file.
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class FileSignature(NamedTuple):
+    inode: int
+    size: int
+    mtime_ns: int
+
+
+def file_signature(path: Path) -> FileSignature | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return FileSignature(stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class Snapshot(NamedTuple):
+    """Contents of a file read once, for the hash and the parser to share."""
+
+    signature: FileSignature
+    hash: str
+    data: bytes
+
+
+def read_snapshot(path: Path) -> Snapshot:
+    with path.open('rb') as f:
+        # The signature of the open file, so it matches the bytes even if the
+        # path is replaced meanwhile.
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    signature = FileSignature(stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    return Snapshot(signature, hashlib.sha256(data).hexdigest(), data)
+
+
+class ChangeDetector:
+    """
+    Tells whether a file changed since the last accepted version.
+
+    A poll only stats the file while its inode, size and modification time stay
+    the same. The file is read and hashed when the signature moves, so a file
+    that is touched or rewritten with the same bytes is not reported. A file
+    modified less than ``debounce`` seconds ago is still being written and is
+    left for a later poll.
+    """
+
+    def __init__(self, path: Path, debounce: float = 0.0, hash: str | None = None):
+        self.path = path
+        self.debounce = debounce
+        self.hash = hash
+        self.signature: FileSignature | None = None
+
+    def poll(self) -> Snapshot | None:
+        """Returns the contents of a changed file, to be passed to ``accept`` once handled."""
+        signature = file_signature(self.path)
+        if signature is None or signature == self.signature:
+            return None
+        if time.time_ns() - signature.mtime_ns < self.debounce * 1e9:
+            return None
+        snapshot = read_snapshot(self.path)
+        if snapshot.hash == self.hash:
+            self.signature = snapshot.signature
+            return None
+        return snapshot
+
+    def accept(self, snapshot: Snapshot) -> None:
+        self.signature = snapshot.signature
+        self.hash = snapshot.hash
+
+
+class Inotify:
+    """Minimal inotify binding, Linux only."""
+
+    def __init__(self, directory: Path, mask: int = WATCH_MASK):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise RuntimeError('inotify is not available on this platform')
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f'Can not watch {directory}')
+
+    def read(self, timeout: float | None = None) -> list[str]:
+        """Names of the files with events, empty when nothing happened within ``timeout`` seconds."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            names.append(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def watch_file(path: Path, debounce: float) -> Iterator[None]:
+    """Yields once per burst of writes to ``path``, after ``debounce`` quiet seconds."""
+    inotify = Inotify(path.parent)
+    try:
+        while True:
+            if path.name not in inotify.read():
+                continue
+            while inotify.read(debounce):
+                pass
+            yield
+    finally:
+        inotify.close()
+
+
+def main() -> None:
+    """Queues an import as soon as the workbook changes: ``python -m app.celery.watcher``."""
+    from app.celery.celery import admin_file, config, update_database
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info('Watching %s', admin_file)
+    for _ in watch_file(admin_file.resolve(), config.IMPORT_DEBOUNCE):
+        logger.info('%s changed, queueing an import', admin_file)
+        update_database.delay()
+
+
+if __name__ == '__main__':
+    main()
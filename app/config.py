@@ -12,6 +12,42 @@ class Config(BaseSettings):
     TESTBASE_URL: str
     REDIS_HOST: str
     REDIS_PORT: int = 6379
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    CACHE_LOCAL_ENABLED: bool = False
+    CACHE_LOCAL_MAX_ENTRIES: int = 1024
+    CACHE_LOCAL_MAX_BYTES: int = 16 * 1024 * 1024
+    CACHE_LOCAL_TTL: float = 5.0
+    CACHE_INVALIDATION_CHANNEL: str = 'cache-invalidation'
+    CACHE_LOCK_TTL: int = 5000
+    CACHE_LOCK_WAIT: float = 5.0
+    CACHE_LOCK_POLL_INTERVAL: float = 0.05
+    CACHE_TTL: dict[str, int] = {'menu': 300, 'submenu': 300, 'dish': 300}
+    CACHE_DEFAULT_TTL: int = 300
+    CACHE_TTL_JITTER: float = 0.1
+    CACHE_STALE_WHILE_REVALIDATE: bool = False
+    CACHE_STALE_TTL: int = 30
+    CACHE_VERSION_TTL: int = 86400
+    # Codec of cached Python objects. Pre-rendered response bodies are stored raw.
+    CACHE_CODEC: str = 'json'
+    CACHE_COMPRESSION_THRESHOLD: int = 4096
+    CACHE_COMPRESSION_LEVEL: int = 6
+    CACHE_WARMUP_CONCURRENCY: int = 8
+    HTTP_CACHE_CONTROL: str = 'no-cache'
+    PAGE_DEFAULT_LIMIT: int = 100
+    PAGE_MAX_LIMIT: int = 1000
+    PAGE_CURSOR_SECRET: str | None = None
+    SQL_JSON_RENDERING: bool = False
+    BULK_MAX_ITEMS: int = 1000
+    IMPORT_WORKBOOK: str = './app/admin/Menu.xlsx'
+    IMPORT_BATCH_SIZE: int = 5000
+    IMPORT_POLL_INTERVAL: float = 15.0
+    IMPORT_DEBOUNCE: float = 2.0
+    IMPORT_LOCK_TTL: float = 60.0
+    IMPORT_SHARDS: int = 1
     ENGINE_URL: str
     TESTBASE_URL_ASYNC: str
     RABBITMQ_HOST: str
@@ -0,0 +1,122 @@
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.database.models import DISHES_COUNTERS, SUBMENU_COUNTERS
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key, so that only one worker migrates at a time.
+MIGRATION_LOCK = 7_301_542_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block.
+    transactional: bool = True
+
+
+# Migrations are applied in order and recorded in schema_migrations. create_all
+# already builds the latest schema for a new database, so every statement must
+# also be a no-op on a schema that is up to date.
+MIGRATIONS = [
+    Migration(
+        1,
+        'counters',
+        (
+            'ALTER TABLE menu ADD COLUMN IF NOT EXISTS submenus_count integer NOT NULL DEFAULT 0',
+            'ALTER TABLE menu ADD COLUMN IF NOT EXISTS dishes_count integer NOT NULL DEFAULT 0',
+            'ALTER TABLE submenu ADD COLUMN IF NOT EXISTS dishes_count integer NOT NULL DEFAULT 0',
+            *(ddl.statement for ddl in SUBMENU_COUNTERS + DISHES_COUNTERS),
+            """
+            UPDATE submenu SET dishes_count = (
+                SELECT count(*) FROM dishes WHERE dishes.submenu_id = submenu.id
+            )
+            """,
+            """
+            UPDATE menu SET
+                submenus_count = (SELECT count(*) FROM submenu WHERE submenu.menu_id = menu.id),
+                dishes_count = (
+                    SELECT coalesce(sum(submenu.dishes_count), 0)
+                    FROM submenu WHERE submenu.menu_id = menu.id
+                )
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        'foreign key indexes',
+        (
+            # The leading column serves the foreign key (lists, counts and the
+            # cascading deletes), the id matches the keyset pagination order.
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_submenu_menu_id_id ON submenu (menu_id, id)',
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_dishes_submenu_id_id ON dishes (submenu_id, id)',
+        ),
+        transactional=False,
+    ),
+    Migration(
+        3,
+        'import row hashes',
+        (
+            # Content hash of every row the last workbook import wrote, so the
+            # next import only applies the rows that differ.
+            """
+            CREATE TABLE IF NOT EXISTS import_rows (
+                table_name text NOT NULL,
+                id uuid NOT NULL,
+                hash text NOT NULL,
+                PRIMARY KEY (table_name, id)
+            )
+            """,
+        ),
+    ),
+]
+
+
+async def migrate(engine: AsyncEngine) -> list[int]:
+    """Applies the pending migrations and returns their versions."""
+    applied: list[int] = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK})
+        try:
+            await conn.exec_driver_sql(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version integer PRIMARY KEY,
+                    name text NOT NULL,
+                    applied_at timestamptz NOT NULL DEFAULT now()
+                )
+                """
+            )
+            result = await conn.exec_driver_sql('SELECT version FROM schema_migrations')
+            done = set(result.scalars())
+            for migration in MIGRATIONS:
+                if migration.version in done:
+                    continue
+                logger.info('Applying migration %s: %s', migration.version, migration.name)
+                if migration.transactional:
+                    async with engine.begin() as transaction:
+                        await _apply(transaction, migration)
+                else:
+                    await _apply(conn, migration)
+                applied.append(migration.version)
+        finally:
+            await conn.execute(
+                text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK}
+            )
+    return applied
+
+
+async def _apply(conn: AsyncConnection, migration: Migration) -> None:
+    for statement in migration.statements:
+        await conn.exec_driver_sql(statement)
+    await conn.execute(
+        text('INSERT INTO schema_migrations (version, name) VALUES (:version, :name)'),
+        {'version': migration.version, 'name': migration.name},
+    )
@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import DECIMAL, Column, ForeignKey, String
+from sqlalchemy import DDL, DECIMAL, Column, ForeignKey, Index, Integer, String, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -13,23 +13,28 @@ class Menu(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String)
     description = Column(String)
+    submenus_count = Column(Integer, nullable=False, default=0, server_default='0')
+    dishes_count = Column(Integer, nullable=False, default=0, server_default='0')
 
-    submenus = relationship('Submenu', backref='menus', lazy='selectin', passive_deletes=True)
+    submenus = relationship('Submenu', backref='menus', lazy='raise', passive_deletes=True)
 
 
 class Submenu(Base):
     __tablename__ = 'submenu'
+    __table_args__ = (Index('ix_submenu_menu_id_id', 'menu_id', 'id'),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String)
     description = Column(String)
+    dishes_count = Column(Integer, nullable=False, default=0, server_default='0')
 
     menu_id = Column(UUID(as_uuid=True), ForeignKey('menu.id', ondelete='CASCADE'))
-    dishes = relationship('Dishes', backref='submenus', lazy='selectin', passive_deletes=True)
+    dishes = relationship('Dishes', backref='submenus', lazy='raise', passive_deletes=True)
 
 
 class Dishes(Base):
     __tablename__ = 'dishes'
+    __table_args__ = (Index('ix_dishes_submenu_id_id', 'submenu_id', 'id'),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True)
     title = Column(String, unique=True)
@@ -39,3 +44,97 @@ class Dishes(Base):
     submenu_id = Column(
         UUID(as_uuid=True), ForeignKey('submenu.id', ondelete='CASCADE')
     )
+
+
+# The counters are kept by row triggers, so they stay exact for every writer:
+# the API, bulk statements and the Celery import. When a submenu is deleted the
+# cascaded dish deletes no longer find their submenu, so the submenu trigger
+# takes its whole dishes_count off the menu instead.
+SUBMENU_COUNTERS = [
+    DDL(
+        """
+        CREATE OR REPLACE FUNCTION submenu_counters() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE menu
+                SET submenus_count = submenus_count - 1,
+                    dishes_count = dishes_count - OLD.dishes_count
+                WHERE id = OLD.menu_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE menu
+                SET submenus_count = submenus_count + 1,
+                    dishes_count = dishes_count + NEW.dishes_count
+                WHERE id = NEW.menu_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    ),
+    DDL(
+        """
+        CREATE OR REPLACE TRIGGER submenu_counters
+        AFTER INSERT OR DELETE ON submenu
+        FOR EACH ROW EXECUTE FUNCTION submenu_counters()
+        """
+    ),
+    DDL(
+        """
+        CREATE OR REPLACE TRIGGER submenu_counters_move
+        AFTER UPDATE OF menu_id ON submenu
+        FOR EACH ROW WHEN (OLD.menu_id IS DISTINCT FROM NEW.menu_id)
+        EXECUTE FUNCTION submenu_counters()
+        """
+    ),
+]
+
+DISHES_COUNTERS = [
+    DDL(
+        """
+        CREATE OR REPLACE FUNCTION dishes_counters() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                WITH changed AS (
+                    UPDATE submenu SET dishes_count = dishes_count - 1
+                    WHERE id = OLD.submenu_id
+                    RETURNING menu_id
+                )
+                UPDATE menu SET dishes_count = dishes_count - 1
+                WHERE id IN (SELECT menu_id FROM changed);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                WITH changed AS (
+                    UPDATE submenu SET dishes_count = dishes_count + 1
+                    WHERE id = NEW.submenu_id
+                    RETURNING menu_id
+                )
+                UPDATE menu SET dishes_count = dishes_count + 1
+                WHERE id IN (SELECT menu_id FROM changed);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    ),
+    DDL(
+        """
+        CREATE OR REPLACE TRIGGER dishes_counters
+        AFTER INSERT OR DELETE ON dishes
+        FOR EACH ROW EXECUTE FUNCTION dishes_counters()
+        """
+    ),
+    DDL(
+        """
+        CREATE OR REPLACE TRIGGER dishes_counters_move
+        AFTER UPDATE OF submenu_id ON dishes
+        FOR EACH ROW WHEN (OLD.submenu_id IS DISTINCT FROM NEW.submenu_id)
+        EXECUTE FUNCTION dishes_counters()
+        """
+    ),
+]
+
+for ddl in SUBMENU_COUNTERS:
+    event.listen(Submenu.__table__, 'after_create', ddl.execute_if(dialect='postgresql'))
+for ddl in DISHES_COUNTERS:
+    event.listen(Dishes.__table__, 'after_create', ddl.execute_if(dialect='postgresql'))
@@ -2,8 +2,10 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from app.cache.redis import cache_instance
 from app.config import Config
 from app.database.db import Base, async_engine
+from app.database.migrations import migrate
 from app.routers.dishes_router import router as dishes_router
 from app.routers.menu_router import router as menus_router
 from app.routers.submenu_router import router as submenu_router
@@ -16,7 +18,10 @@ async def lifespan(app: FastAPI):
     try:
         async with async_engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+        await migrate(async_engine)
+        await cache_instance.start()
         yield
+        await cache_instance.close()
     except Exception as error:
         print(error)
 
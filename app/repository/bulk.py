@@ -0,0 +1,41 @@
+from collections.abc import Collection
+from decimal import Decimal
+
+from pydantic import UUID4
+
+from app.schemas.schemas import BulkItemResult
+
+# dishes.price is DECIMAL(10, 2), it holds 8 digits before the point.
+MAX_PRICE = Decimal(10) ** 8
+INVALID_PRICE = 'invalid price'
+
+
+def bulk_delete_results(
+    ids: list[UUID4], deleted: Collection[UUID4], not_found: str
+) -> list[BulkItemResult]:
+    results = []
+    seen = set()
+    for index, id in enumerate(ids):
+        if id in seen:
+            error = 'duplicate item in batch'
+        elif id not in deleted:
+            error = not_found
+        else:
+            error = None
+        seen.add(id)
+        results.append(BulkItemResult(index=index, id=id, error=error))
+    return results
+
+
+def bulk_price(price: str | float) -> Decimal | None:
+    """
+    The price as DECIMAL(10, 2) stores it, or None when it is not a number or
+    does not fit. One such item would fail the statement of the whole batch.
+    """
+    try:
+        value = Decimal(f'{float(price):.2f}')
+    except ValueError:
+        return None
+    if not value.is_finite() or abs(value) >= MAX_PRICE:
+        return None
+    return value
@@ -1,12 +1,26 @@
+import uuid
+from typing import Any
+
 from pydantic import UUID4
-from sqlalchemy import delete
+from sqlalchemy import DECIMAL, Select, String, Text, and_, cast, column, delete, update, values
+from sqlalchemy.dialects.postgresql import UUID, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.database.db import AsyncSession as AppAsyncSession
-from app.database.models import Dishes
-from app.repository.exceptions import DishExistsException
+from app.database.models import Dishes, Submenu
+from app.repository.bulk import INVALID_PRICE, bulk_delete_results, bulk_price
+from app.repository.exceptions import DishExistsException, SubmenuExistsException
+from app.repository.pagination import page
+from app.repository.sql_json import json_page, rendered_page
 from app.schemas.schemas import Dishes as DishesModel
-from app.schemas.schemas import DishesCreate, DishesUpdate
+from app.schemas.schemas import (
+    BulkItemResult,
+    DishesBulkUpdate,
+    DishesCreate,
+    DishesUpdate,
+)
 
 
 class DishesRepository:
@@ -15,9 +29,11 @@ class DishesRepository:
 
     async def get_dish(self, submenu_id: UUID4, id: UUID4) -> Dishes:
         async with self.async_session.begin() as db_session:
-            stmt = select(Dishes).where(Dishes.id == id)
+            stmt = select(
+                Dishes.id, Dishes.title, Dishes.description, Dishes.price
+            ).where(Dishes.id == id)
             dish = await db_session.execute(stmt)
-            dish = dish.scalars().first()
+            dish = dish.first()
             if not dish:
                 raise DishExistsException()
             dish = DishesModel.model_validate(dish)
@@ -49,20 +65,213 @@ class DishesRepository:
             dish = DishesModel.model_validate(dish)
             return dish
 
-    async def get_dishes_list(self, submenu_id: UUID4) -> list[Dishes]:
+    def __dishes_page(
+        self, submenu_id: UUID4, limit: int, after: UUID4 | None, *columns: Any
+    ) -> Select:
+        stmt = (
+            select(Dishes.id, Dishes.title, Dishes.description, *columns)
+            .filter(Dishes.submenu_id == submenu_id)
+            .order_by(Dishes.id)
+        )
+        if after is not None:
+            stmt = stmt.filter(Dishes.id > after)
+        return stmt.limit(limit + 1)
+
+    async def get_dishes_list(
+        self, submenu_id: UUID4, limit: int, after: UUID4 | None = None
+    ) -> tuple[list[DishesModel], str | None]:
         async with self.async_session.begin() as db_session:
-            stmt = select(Dishes).filter(Dishes.submenu_id == submenu_id)
+            stmt = self.__dishes_page(submenu_id, limit, after, Dishes.price)
             result = await db_session.execute(stmt)
-            dishes = result.scalars().all()
-            if not dishes:
-                return []
-            dishes_list = list(map(DishesModel.model_validate, dishes))
+            rows, next_cursor = page(result.all(), limit)
+            dishes_list = list(map(DishesModel.model_validate, rows))
             for dish in dishes_list:
                 dish.price = f'{float(dish.price):.2f}'
-            return dishes_list
+            return dishes_list, next_cursor
+
+    async def get_dishes_list_json(
+        self, submenu_id: UUID4, limit: int, after: UUID4 | None = None
+    ) -> tuple[bytes, str | None]:
+        async with self.async_session.begin() as db_session:
+            # numeric(10, 2) as text keeps both decimals, like the API formats prices.
+            price = cast(Dishes.price, Text).label('price')
+            stmt = json_page(self.__dishes_page(submenu_id, limit, after, price), Dishes.id, limit)
+            result = await db_session.execute(stmt)
+            return rendered_page(result.one(), limit)
 
     async def delete_dish(self, submenu_id: UUID4, dish_id: UUID4) -> None:
         async with self.async_session.begin() as db_session:
             query = delete(Dishes).where(Dishes.id == dish_id)
             await db_session.execute(query)
             await db_session.commit()
+
+    async def __check_submenu(
+        self, db_session: AsyncSession, menu_id: UUID4, submenu_id: UUID4
+    ) -> None:
+        # FOR SHARE keeps the submenu from being deleted while the batch is written.
+        stmt = (
+            select(Submenu.id)
+            .filter_by(id=submenu_id, menu_id=menu_id)
+            .with_for_update(read=True)
+        )
+        if (await db_session.execute(stmt)).first() is None:
+            raise SubmenuExistsException()
+
+    async def bulk_create(
+        self, menu_id: UUID4, submenu_id: UUID4, dishes: list[DishesCreate]
+    ) -> list[BulkItemResult]:
+        ids = [uuid.uuid4() for _ in dishes]
+        prices = [bulk_price(dish.price) for dish in dishes]
+        rows = [
+            {**dish.model_dump(), 'id': id, 'submenu_id': submenu_id, 'price': price}
+            for id, dish, price in zip(ids, dishes, prices)
+            if price is not None
+        ]
+        created: set[UUID4] = set()
+        async with self.async_session.begin() as db_session:
+            await self.__check_submenu(db_session, menu_id, submenu_id)
+            if rows:
+                stmt = (
+                    insert(Dishes)
+                    .values(rows)
+                    .on_conflict_do_nothing(index_elements=[Dishes.title])
+                    .returning(Dishes.id)
+                )
+                created = set((await db_session.execute(stmt)).scalars())
+        return [
+            BulkItemResult(index=index, id=id)
+            if id in created
+            else BulkItemResult(
+                index=index,
+                error=INVALID_PRICE if price is None else 'dish title already exists',
+            )
+            for index, (id, price) in enumerate(zip(ids, prices))
+        ]
+
+    async def bulk_update(
+        self, menu_id: UUID4, submenu_id: UUID4, dishes: list[DishesBulkUpdate]
+    ) -> list[BulkItemResult]:
+        results: dict[int, BulkItemResult] = {}
+        pending: dict[int, DishesBulkUpdate] = {}
+        ids, titles = set(), set()
+        for index, dish in enumerate(dishes):
+            if bulk_price(dish.price) is None:
+                results[index] = BulkItemResult(index=index, id=dish.id, error=INVALID_PRICE)
+                continue
+            if dish.id in ids or dish.title in titles:
+                results[index] = BulkItemResult(
+                    index=index, id=dish.id, error='duplicate item in batch'
+                )
+                continue
+            ids.add(dish.id)
+            titles.add(dish.title)
+            pending[index] = dish
+        updated: set[UUID4] = set()
+        async with self.async_session.begin() as db_session:
+            await self.__check_submenu(db_session, menu_id, submenu_id)
+            await self.__drop_taken_titles(db_session, submenu_id, pending, results)
+            while pending:
+                try:
+                    async with db_session.begin_nested():
+                        updated = await self.__update_dishes(
+                            db_session, submenu_id, list(pending.values())
+                        )
+                    break
+                except IntegrityError:
+                    # Another transaction took one of the titles after the
+                    # check. It has committed by now, so the next check sees it.
+                    count = len(pending)
+                    await self.__drop_taken_titles(db_session, submenu_id, pending, results)
+                    if len(pending) == count:
+                        raise
+        for index, dish in pending.items():
+            results[index] = (
+                BulkItemResult(index=index, id=dish.id)
+                if dish.id in updated
+                else BulkItemResult(index=index, id=dish.id, error='dish not found')
+            )
+        return [results[index] for index in range(len(dishes))]
+
+    async def __drop_taken_titles(
+        self,
+        db_session: AsyncSession,
+        submenu_id: UUID4,
+        pending: dict[int, DishesBulkUpdate],
+        results: dict[int, BulkItemResult],
+    ) -> None:
+        """
+        Answers the items whose new title belongs to a dish the batch does not
+        update. Dishes of the batch may trade titles, but a dish that is left
+        out keeps its title, so the check repeats until nothing is left out.
+        """
+        while pending:
+            ids = [dish.id for dish in pending.values()]
+            stmt = select(Dishes.title).where(
+                Dishes.title.in_([dish.title for dish in pending.values()]),
+                ~and_(Dishes.id.in_(ids), Dishes.submenu_id == submenu_id),
+            )
+            taken = set((await db_session.execute(stmt)).scalars())
+            if not taken:
+                return
+            for index, dish in list(pending.items()):
+                if dish.title in taken:
+                    results[index] = BulkItemResult(
+                        index=index, id=dish.id, error='dish title already exists'
+                    )
+                    del pending[index]
+
+    async def __update_dishes(
+        self, db_session: AsyncSession, submenu_id: UUID4, dishes: list[DishesBulkUpdate]
+    ) -> set[UUID4]:
+        ids = [dish.id for dish in dishes]
+        # The unique index on title is checked row by row, so the titles the
+        # batch moves between its dishes are cleared first. NULL titles never
+        # conflict.
+        await db_session.execute(
+            update(Dishes)
+            .where(
+                Dishes.id.in_(ids),
+                Dishes.submenu_id == submenu_id,
+                Dishes.title.in_([dish.title for dish in dishes]),
+            )
+            .values(title=None)
+            .execution_options(synchronize_session=False)
+        )
+        changes = values(
+            column('id', UUID(as_uuid=True)),
+            column('title', String),
+            column('description', String),
+            column('price', DECIMAL(10, 2)),
+            name='changes',
+        ).data(
+            [
+                (dish.id, dish.title, dish.description, bulk_price(dish.price))
+                for dish in dishes
+            ]
+        )
+        stmt = (
+            update(Dishes)
+            .where(Dishes.id == changes.c.id, Dishes.submenu_id == submenu_id)
+            .values(
+                title=changes.c.title,
+                description=changes.c.description,
+                price=changes.c.price,
+            )
+            .returning(Dishes.id)
+            .execution_options(synchronize_session=False)
+        )
+        return set((await db_session.execute(stmt)).scalars())
+
+    async def bulk_delete(
+        self, menu_id: UUID4, submenu_id: UUID4, ids: list[UUID4]
+    ) -> list[BulkItemResult]:
+        async with self.async_session.begin() as db_session:
+            await self.__check_submenu(db_session, menu_id, submenu_id)
+            stmt = (
+                delete(Dishes)
+                .where(Dishes.submenu_id == submenu_id, Dishes.id.in_(set(ids)))
+                .returning(Dishes.id)
+                .execution_options(synchronize_session=False)
+            )
+            deleted = set((await db_session.execute(stmt)).scalars())
+        return bulk_delete_results(ids, deleted, 'dish not found')
@@ -8,3 +8,7 @@ class SubmenuExistsException(Exception):
 
 class DishExistsException(Exception):
     pass
+
+
+class InvalidCursorException(Exception):
+    pass
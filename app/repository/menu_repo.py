@@ -1,12 +1,15 @@
+from collections.abc import AsyncIterator
+from typing import Any
+
 from pydantic import UUID4
-from sqlalchemy import func
+from sqlalchemy import Select, Text, cast
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from sqlalchemy.sql import label
 
 from app.database.db import AsyncSession as AppAsyncSession
 from app.database.models import Dishes, Menu, Submenu
 from app.repository.exceptions import MenuExistsException
+from app.repository.pagination import page
+from app.repository.sql_json import json_array, json_object, json_page, rendered_page
 from app.schemas.schemas import Menu as MenuModel
 from app.schemas.schemas import MenuCreate, MenuItem, MenuUpdate
 
@@ -21,39 +24,40 @@ class MenuRepository:
 
     async def __get_complex_menu(self, menu_id: UUID4) -> MenuModel:
         async with self.async_session.begin() as db_session:
-            statement = (
-                select(
-                    Menu,
-                    label('submenu_count', func.count(Submenu.id.distinct())),
-                    label('dishes_count', func.count(Dishes.id)),
-                )
-                .filter(Menu.id == menu_id)
-                .outerjoin(Submenu, Menu.id == Submenu.menu_id)
-                .outerjoin(Dishes, Submenu.id == Dishes.submenu_id)
-                .group_by(Menu)
-            )
+            statement = select(
+                Menu.id,
+                Menu.title,
+                Menu.description,
+                Menu.submenus_count,
+                Menu.dishes_count,
+            ).filter(Menu.id == menu_id)
             result = await db_session.execute(statement)
-            try:
-                menu, submenu_count, dishes_count = result.first()
-            except TypeError:
+            menu = result.first()
+            if not menu:
                 raise MenuExistsException()
-            menu_dict = {
-                'id': menu.id,
-                'title': menu.title,
-                'description': menu.description,
-                'submenus_count': submenu_count,
-                'dishes_count': dishes_count,
-            }
-            return MenuModel.model_validate(menu_dict)
+            return MenuModel.model_validate(menu)
+
+    def __menu_page(self, limit: int, after: UUID4 | None) -> Select:
+        stmt = select(Menu.id, Menu.title, Menu.description).order_by(Menu.id)
+        if after is not None:
+            stmt = stmt.filter(Menu.id > after)
+        return stmt.limit(limit + 1)
 
-    async def get_menu_list(self) -> list[MenuItem]:
+    async def get_menu_list(
+        self, limit: int, after: UUID4 | None = None
+    ) -> tuple[list[MenuItem], str | None]:
         async with self.async_session.begin() as db_session:
-            menus = await db_session.execute(select(Menu))
-            menus = menus.scalars().all()
-            if not menus:
-                return []
-            result = list(map(MenuModel.model_validate, menus))
-            return result
+            menus = await db_session.execute(self.__menu_page(limit, after))
+            rows, next_cursor = page(menus.all(), limit)
+            return list(map(MenuItem.model_validate, rows)), next_cursor
+
+    async def get_menu_list_json(
+        self, limit: int, after: UUID4 | None = None
+    ) -> tuple[bytes, str | None]:
+        async with self.async_session.begin() as db_session:
+            stmt = json_page(self.__menu_page(limit, after), Menu.id, limit)
+            result = await db_session.execute(stmt)
+            return rendered_page(result.one(), limit)
 
     async def create_menu(self, menu: MenuCreate) -> MenuModel:
         async with self.async_session.begin() as db_session:
@@ -79,13 +83,122 @@ class MenuRepository:
             await db_session.delete(db_menu)
             await db_session.commit()
 
-    async def get_all_menus(self) -> list:
+    async def stream_all_menus(self, batch_size: int = 1000) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yields the menus one subtree at a time. The tree is read as one outer
+        join ordered by menu, submenu and dish through a server-side cursor, so
+        only the rows of the current menu are held in memory.
+        """
+        stmt = (
+            select(
+                Menu.id.label('menu_id'),
+                Menu.title.label('menu_title'),
+                Menu.description.label('menu_description'),
+                Submenu.id.label('submenu_id'),
+                Submenu.title.label('submenu_title'),
+                Submenu.description.label('submenu_description'),
+                Dishes.id.label('dish_id'),
+                Dishes.title.label('dish_title'),
+                Dishes.description.label('dish_description'),
+                Dishes.price,
+            )
+            .outerjoin(Submenu, Submenu.menu_id == Menu.id)
+            .outerjoin(Dishes, Dishes.submenu_id == Submenu.id)
+            .order_by(Menu.id, Submenu.id, Dishes.id)
+            .execution_options(yield_per=batch_size)
+        )
         async with self.async_session.begin() as db_session:
-            menus = select(Menu).options(
-                selectinload(Menu.submenus).selectinload(Submenu.dishes)
+            result = await db_session.stream(stmt)
+            menu: dict[str, Any] | None = None
+            submenu: dict[str, Any] | None = None
+            async for row in result:
+                if menu is None or menu['id'] != row.menu_id:
+                    if menu is not None:
+                        yield menu
+                    menu = {
+                        'id': row.menu_id,
+                        'title': row.menu_title,
+                        'description': row.menu_description,
+                        'submenus': [],
+                    }
+                    submenu = None
+                if row.submenu_id is None:
+                    continue
+                if submenu is None or submenu['id'] != row.submenu_id:
+                    submenu = {
+                        'id': row.submenu_id,
+                        'title': row.submenu_title,
+                        'description': row.submenu_description,
+                        'menu_id': row.menu_id,
+                        'dishes': [],
+                    }
+                    menu['submenus'].append(submenu)
+                if row.dish_id is not None:
+                    submenu['dishes'].append(
+                        {
+                            'id': row.dish_id,
+                            'title': row.dish_title,
+                            'description': row.dish_description,
+                            'price': row.price,
+                            'submenu_id': row.submenu_id,
+                        }
+                    )
+            if menu is not None:
+                yield menu
+
+    async def stream_all_menus_json(self, batch_size: int = 1000) -> AsyncIterator[bytes]:
+        """
+        Same as stream_all_menus, but every menu subtree is rendered to JSON by
+        the database and passed on as is.
+        """
+        dishes = (
+            select(
+                json_array(
+                    json_object(
+                        id=Dishes.id,
+                        title=Dishes.title,
+                        description=Dishes.description,
+                        price=Dishes.price,
+                        submenu_id=Dishes.submenu_id,
+                    ),
+                    Dishes.id,
+                )
+            )
+            .where(Dishes.submenu_id == Submenu.id)
+            .scalar_subquery()
+        )
+        submenus = (
+            select(
+                json_array(
+                    json_object(
+                        id=Submenu.id,
+                        title=Submenu.title,
+                        description=Submenu.description,
+                        menu_id=Submenu.menu_id,
+                        dishes=dishes,
+                    ),
+                    Submenu.id,
+                )
             )
-        result = await db_session.execute(menus)
-        result = result.scalars().all()
-        if not result:
-            return []
-        return result
+            .where(Submenu.menu_id == Menu.id)
+            .scalar_subquery()
+        )
+        stmt = (
+            select(
+                cast(
+                    json_object(
+                        id=Menu.id,
+                        title=Menu.title,
+                        description=Menu.description,
+                        submenus=submenus,
+                    ),
+                    Text,
+                )
+            )
+            .order_by(Menu.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async with self.async_session.begin() as db_session:
+            result = await db_session.stream_scalars(stmt)
+            async for menu in result:
+                yield menu.encode()
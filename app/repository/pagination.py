@@ -0,0 +1,59 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import secrets
+import uuid
+from collections.abc import Sequence
+from typing import Any, NamedTuple
+
+from app.config import Config
+from app.repository.exceptions import InvalidCursorException
+
+config = Config()
+
+# Cursors are signed, so that the cache only keeps pages after cursors the
+# server issued. Without PAGE_CURSOR_SECRET every process signs with its own
+# key, and the pages after cursors issued by another process are not cached.
+CURSOR_KEY = (config.PAGE_CURSOR_SECRET or secrets.token_hex(32)).encode()
+SIGNATURE_SIZE = 8
+
+
+class Cursor(NamedTuple):
+    after: uuid.UUID
+    issued: bool
+
+
+def _sign(data: bytes) -> bytes:
+    return hmac.new(CURSOR_KEY, data, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def encode_cursor(last_id: uuid.UUID) -> str:
+    data = last_id.bytes + _sign(last_id.bytes)
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """
+    The id a cursor points after. Cursors without a valid signature are still
+    accepted, they are only not ``issued``.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        after = uuid.UUID(bytes=data[:16])
+    except (binascii.Error, ValueError):
+        raise InvalidCursorException()
+    if len(data) not in (16, 16 + SIGNATURE_SIZE):
+        raise InvalidCursorException()
+    issued = hmac.compare_digest(data[16:], _sign(data[:16]))
+    return Cursor(after, issued)
+
+
+def page(rows: Sequence[Any], limit: int) -> tuple[Sequence[Any], str | None]:
+    """
+    Splits ``limit + 1`` rows ordered by id into the page and the cursor of the
+    next one, which is only given when the extra row shows there is more.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], encode_cursor(rows[limit - 1].id)
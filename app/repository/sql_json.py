@@ -0,0 +1,56 @@
+import uuid
+from itertools import chain
+from typing import Any
+
+from sqlalchemy import Select, Text, case, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.repository.pagination import encode_cursor
+
+EMPTY_ARRAY = literal_column("'[]'::json")
+
+
+def json_object(**fields: Any) -> ColumnElement:
+    return func.json_build_object(
+        *chain.from_iterable(
+            (literal_column(f"'{name}'"), value) for name, value in fields.items()
+        )
+    )
+
+
+def json_array(item: ColumnElement, order_by: Any) -> ColumnElement:
+    return func.coalesce(func.json_agg(aggregate_order_by(item, order_by)), EMPTY_ARRAY)
+
+
+def json_page(query: Select, id_column: Any, limit: int) -> Select:
+    """
+    Renders a keyset page in the database. ``query`` selects the item fields
+    ordered by ``id_column`` and limited to ``limit + 1`` rows; the result row
+    holds the JSON array of the first ``limit`` items, the number of rows found
+    and the id of the last item on the page.
+    """
+    rows = query.add_columns(
+        func.row_number().over(order_by=id_column).label('position')
+    ).subquery()
+    fields = {column.name: column for column in rows.c if column.name != 'position'}
+    on_page = rows.c.position <= limit
+    return select(
+        cast(
+            func.coalesce(
+                func.json_agg(
+                    aggregate_order_by(json_object(**fields), rows.c.id)
+                ).filter(on_page),
+                EMPTY_ARRAY,
+            ),
+            Text,
+        ).label('body'),
+        func.count().label('found'),
+        func.min(case((rows.c.position == limit, cast(rows.c.id, Text)))).label('last_id'),
+    )
+
+
+def rendered_page(row: Row, limit: int) -> tuple[bytes, str | None]:
+    next_cursor = encode_cursor(uuid.UUID(row.last_id)) if row.found > limit else None
+    return row.body.encode(), next_cursor
@@ -1,33 +1,65 @@
-from fastapi.encoders import jsonable_encoder
+import uuid
+
 from pydantic import UUID4
+from sqlalchemy import Select, String, column, delete, insert, update, values
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.future import select
 
 from app.database.db import AsyncSession as AppAsyncSession
-from app.database.models import Submenu
-from app.repository.exceptions import SubmenuExistsException
-from app.schemas.schemas import SubmenuCreate, SubmenuUpdate
+from app.database.models import Menu, Submenu
+from app.repository.bulk import bulk_delete_results
+from app.repository.exceptions import MenuExistsException, SubmenuExistsException
+from app.repository.pagination import page
+from app.repository.sql_json import json_page, rendered_page
+from app.schemas.schemas import Submenu as SubmenuModel
+from app.schemas.schemas import (
+    BulkItemResult,
+    SubmenuBulkUpdate,
+    SubmenuCreate,
+    SubmenuUpdate,
+)
 
 
 class SubmenuRepositary:
     def __init__(self, session: AppAsyncSession):
         self.async_session: AppAsyncSession = session
 
-    async def get_sub(self, menu_id: UUID4, submenu_id: UUID4) -> Submenu:
+    async def get_sub(self, menu_id: UUID4, submenu_id: UUID4) -> SubmenuModel:
         async with self.async_session.begin() as db_session:
-            stmt = select(Submenu).filter_by(menu_id=menu_id, id=submenu_id)
+            stmt = select(
+                Submenu.id, Submenu.title, Submenu.description, Submenu.dishes_count
+            ).filter_by(menu_id=menu_id, id=submenu_id)
             result = await db_session.execute(stmt)
-            submenu = result.scalars().first()
+            submenu = result.first()
             if not submenu:
                 raise SubmenuExistsException()
-            result = jsonable_encoder(submenu)
-            return result
+            return SubmenuModel.model_validate(submenu)
+
+    def __submenu_page(self, menu_id: UUID4, limit: int, after: UUID4 | None) -> Select:
+        stmt = (
+            select(Submenu.id, Submenu.title, Submenu.description, Submenu.dishes_count)
+            .filter_by(menu_id=menu_id)
+            .order_by(Submenu.id)
+        )
+        if after is not None:
+            stmt = stmt.filter(Submenu.id > after)
+        return stmt.limit(limit + 1)
 
-    async def get_submenu_list(self, menu_id: UUID4) -> list[Submenu]:
+    async def get_submenu_list(
+        self, menu_id: UUID4, limit: int, after: UUID4 | None = None
+    ) -> tuple[list[SubmenuModel], str | None]:
         async with self.async_session.begin() as db_session:
-            stmt = select(Submenu).filter_by(menu_id=menu_id)
+            result = await db_session.execute(self.__submenu_page(menu_id, limit, after))
+            rows, next_cursor = page(result.all(), limit)
+            return list(map(SubmenuModel.model_validate, rows)), next_cursor
+
+    async def get_submenu_list_json(
+        self, menu_id: UUID4, limit: int, after: UUID4 | None = None
+    ) -> tuple[bytes, str | None]:
+        async with self.async_session.begin() as db_session:
+            stmt = json_page(self.__submenu_page(menu_id, limit, after), Submenu.id, limit)
             result = await db_session.execute(stmt)
-            all_submenu = result.scalars().all()
-            return all_submenu
+            return rendered_page(result.one(), limit)
 
     async def create_submenu(self, menu_id: UUID4, submenu: SubmenuCreate) -> Submenu:
         async with self.async_session.begin() as db_session:
@@ -59,3 +91,70 @@ class SubmenuRepositary:
             db_submenu = result.scalars().first()
             await db_session.delete(db_submenu)
             await db_session.commit()
+
+    async def __check_menu(self, db_session: AppAsyncSession, menu_id: UUID4) -> None:
+        # FOR SHARE keeps the menu from being deleted while the batch is written.
+        stmt = select(Menu.id).filter_by(id=menu_id).with_for_update(read=True)
+        if (await db_session.execute(stmt)).first() is None:
+            raise MenuExistsException()
+
+    async def bulk_create(
+        self, menu_id: UUID4, submenus: list[SubmenuCreate]
+    ) -> list[BulkItemResult]:
+        ids = [uuid.uuid4() for _ in submenus]
+        async with self.async_session.begin() as db_session:
+            await self.__check_menu(db_session, menu_id)
+            await db_session.execute(
+                insert(Submenu).values(
+                    [
+                        {**submenu.model_dump(), 'id': id, 'menu_id': menu_id}
+                        for id, submenu in zip(ids, submenus)
+                    ]
+                )
+            )
+        return [BulkItemResult(index=index, id=id) for index, id in enumerate(ids)]
+
+    async def bulk_update(
+        self, menu_id: UUID4, submenus: list[SubmenuBulkUpdate]
+    ) -> list[BulkItemResult]:
+        pending: dict[UUID4, SubmenuBulkUpdate] = {}
+        for submenu in submenus:
+            pending.setdefault(submenu.id, submenu)
+        changes = values(
+            column('id', UUID(as_uuid=True)),
+            column('title', String),
+            column('description', String),
+            name='changes',
+        ).data([(submenu.id, submenu.title, submenu.description) for submenu in pending.values()])
+        stmt = (
+            update(Submenu)
+            .where(Submenu.id == changes.c.id, Submenu.menu_id == menu_id)
+            .values(title=changes.c.title, description=changes.c.description)
+            .returning(Submenu.id)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.async_session.begin() as db_session:
+            await self.__check_menu(db_session, menu_id)
+            updated = set((await db_session.execute(stmt)).scalars())
+        results = []
+        for index, submenu in enumerate(submenus):
+            if pending[submenu.id] is not submenu:
+                error = 'duplicate item in batch'
+            elif submenu.id not in updated:
+                error = 'submenu not found'
+            else:
+                error = None
+            results.append(BulkItemResult(index=index, id=submenu.id, error=error))
+        return results
+
+    async def bulk_delete(self, menu_id: UUID4, ids: list[UUID4]) -> list[BulkItemResult]:
+        async with self.async_session.begin() as db_session:
+            await self.__check_menu(db_session, menu_id)
+            stmt = (
+                delete(Submenu)
+                .where(Submenu.menu_id == menu_id, Submenu.id.in_(set(ids)))
+                .returning(Submenu.id)
+                .execution_options(synchronize_session=False)
+            )
+            deleted = set((await db_session.execute(stmt)).scalars())
+        return bulk_delete_results(ids, deleted, 'submenu not found')
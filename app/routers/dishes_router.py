@@ -1,12 +1,25 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    status,
+)
+from fastapi.responses import JSONResponse, Response
 from pydantic import UUID4
 
+from app.config import Config
 from app.database.models import Dishes
-from app.repository.exceptions import DishExistsException
+from app.repository.exceptions import DishExistsException, SubmenuExistsException
+from app.routers.pagination import PageParams
+from app.routers.responses import cached_response
 from app.schemas import schemas
 from app.services.dish import DishesService
 
+config = Config()
+
 router = APIRouter(
     tags=['dishes'],
     prefix='/api/v1/menus/{menu_id}/submenus/{submenu_id}',
@@ -20,22 +33,108 @@ router = APIRouter(
     name='Список блюд',
 )
 async def get_dishes_list(
-    menu_id: UUID4, submenu_id: UUID4, dishes: DishesService = Depends()
-) -> list[schemas.Dishes]:
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    page: PageParams = Depends(),
+    if_none_match: str | None = Header(default=None),
+    dishes: DishesService = Depends(),
+) -> Response:
     """
     A function to get the list of dishes based on menu_id and submenu_id.
 
     Parameters:
         menu_id (UUID4): The ID of the menu.
         submenu_id (UUID4): The ID of the submenu.
+        page (PageParams): The limit and cursor of the requested page.
+        if_none_match (str, optional): ETag of the list the client already has.
         dishes (DishesService, optional): An instance of DishesService. Defaults to None.
 
     Returns:
-        list[schemas.Dishes]: A list of dishes based on the menu_id and submenu_id.
+        Response: The cached JSON page of dishes ordered by id, with the cursor of the
+        next page in the X-Next-Cursor header, or 304 Not Modified when the client ETag
+        is still current.
     """
-    dishes_list = await dishes.get_dishes_list(menu_id, submenu_id)
+    cached = await dishes.get_dishes_list(
+        menu_id, submenu_id, page.limit, page.after, if_none_match, page.cached
+    )
+    return cached_response(cached)
 
-    return dishes_list
+
+# The bulk routes are registered before /dishes/{dish_id}, which would match them first.
+@router.post(
+    '/dishes/bulk',
+    response_model=schemas.BulkResult,
+    responses={404: {'model': schemas.NotFoundError}},
+    name='Создать блюда пакетом',
+)
+async def add_dishes_bulk(
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    background_tasks: BackgroundTasks,
+    data: list[schemas.DishesCreate] = Body(min_length=1, max_length=config.BULK_MAX_ITEMS),
+    dishes: DishesService = Depends(),
+) -> schemas.BulkResult:
+    """
+    Create a batch of dishes with a single INSERT.
+
+    Returns:
+    - schemas.BulkResult: the id of every created dish, or the reason it was skipped,
+      in the order of the request
+    """
+    try:
+        return await dishes.bulk_create(menu_id, submenu_id, data, background_tasks)
+    except SubmenuExistsException:
+        raise HTTPException(status_code=404, detail='submenu not found')
+
+
+@router.patch(
+    '/dishes/bulk',
+    response_model=schemas.BulkResult,
+    responses={404: {'model': schemas.NotFoundError}},
+    name='Обновить блюда пакетом',
+)
+async def update_dishes_bulk(
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    background_tasks: BackgroundTasks,
+    data: list[schemas.DishesBulkUpdate] = Body(min_length=1, max_length=config.BULK_MAX_ITEMS),
+    dishes: DishesService = Depends(),
+) -> schemas.BulkResult:
+    """
+    Update a batch of dishes, identified by their ids, with a single UPDATE.
+
+    Returns:
+    - schemas.BulkResult: the result of every item in the order of the request
+    """
+    try:
+        return await dishes.bulk_update(menu_id, submenu_id, data, background_tasks)
+    except SubmenuExistsException:
+        raise HTTPException(status_code=404, detail='submenu not found')
+
+
+@router.delete(
+    '/dishes/bulk',
+    response_model=schemas.BulkResult,
+    responses={404: {'model': schemas.NotFoundError}},
+    name='Удалить блюда пакетом',
+)
+async def delete_dishes_bulk(
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    background_tasks: BackgroundTasks,
+    data: list[UUID4] = Body(min_length=1, max_length=config.BULK_MAX_ITEMS),
+    dishes: DishesService = Depends(),
+) -> schemas.BulkResult:
+    """
+    Delete a batch of dishes by their ids with a single DELETE.
+
+    Returns:
+    - schemas.BulkResult: the result of every item in the order of the request
+    """
+    try:
+        return await dishes.bulk_delete(menu_id, submenu_id, data, background_tasks)
+    except SubmenuExistsException:
+        raise HTTPException(status_code=404, detail='submenu not found')
 
 
 @router.get(
@@ -45,13 +144,17 @@ async def get_dishes_list(
     name='Блюдо по id',
 )
 async def get_dish(
-    menu_id: UUID4, submenu_id: UUID4, dish_id: UUID4, dishes: DishesService = Depends()
-) -> schemas.Dishes:
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    dish_id: UUID4,
+    if_none_match: str | None = Header(default=None),
+    dishes: DishesService = Depends(),
+) -> Response:
     try:
-        dish = await dishes.get(menu_id, submenu_id, dish_id)
+        cached = await dishes.get(menu_id, submenu_id, dish_id, if_none_match)
     except DishExistsException:
         raise HTTPException(status_code=404, detail='dish not found')
-    return dish
+    return cached_response(cached)
 
 
 @router.post(
@@ -1,14 +1,25 @@
 from typing import Any
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    status,
+)
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import UUID4
 
 from app.database.models import Menu
 from app.repository.exceptions import MenuExistsException
+from app.routers.pagination import PageParams
+from app.routers.responses import cached_response
 from app.schemas import schemas
 from app.services.menu import MenuService
 
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
 router = APIRouter(
     tags=['menu'],
     prefix='/api/v1/menus',
@@ -21,12 +32,19 @@ router = APIRouter(
     responses={404: {'model': schemas.NotFoundError}},
     name='Список меню',
 )
-async def get_menu_list(menu: MenuService = Depends()) -> list[schemas.MenuItem]:
+async def get_menu_list(
+    page: PageParams = Depends(),
+    if_none_match: str | None = Header(default=None),
+    menu: MenuService = Depends(),
+) -> Response:
     """
     A function to get the menu list using MenuService dependency and returning a list of MenuItem schemas.
+    The list is paginated by id, the cursor of the next page is sent in the X-Next-Cursor header.
+    The body is served as cached, it was validated against the schema when the cache was filled.
+    Answers 304 Not Modified when the client ETag is still current.
     """
-    list = await menu.get_menu_list()
-    return list
+    cached = await menu.get_menu_list(page.limit, page.after, if_none_match, page.cached)
+    return cached_response(cached)
 
 
 @router.post(
@@ -60,15 +78,20 @@ async def add_menu(
     responses={404: {'model': schemas.NotFoundError}},
     name='Меню по id',
 )
-async def get_menu(id: UUID4, menu: MenuService = Depends()) -> dict[str, Any]:
+async def get_menu(
+    id: UUID4,
+    if_none_match: str | None = Header(default=None),
+    menu: MenuService = Depends(),
+) -> Response:
     """
-    A function to get a menu by its ID, with parameters id: UUID4, menu: MenuService = Depends(), and return type dict[str, Any].
+    A function to get a menu by its ID, with parameters id: UUID4, if_none_match: str | None,
+    menu: MenuService = Depends(), and return type Response.
     """
     try:
-        return_menu = await menu.get_complex_query(id)
+        cached = await menu.get(id, if_none_match)
     except MenuExistsException:
         raise HTTPException(status_code=404, detail='menu not found')
-    return return_menu
+    return cached_response(cached)
 
 
 @router.patch(
@@ -132,18 +155,25 @@ async def delete_menu(
     responses={404: {'model': schemas.NotFoundError}},
     name='Посчитать подменю и блюда',
 )
-async def get_menu_counts(id: UUID4, menu: MenuService = Depends()) -> dict[str, Any]:
+async def get_menu_counts(
+    id: UUID4,
+    if_none_match: str | None = Header(default=None),
+    menu: MenuService = Depends(),
+) -> Response:
     """
     A function to get the counts of submenus and dishes for a given menu ID.
 
     Args:
         id: The UUID4 ID of the menu.
+        if_none_match: ETag of the counts the client already has.
         menu: An instance of the MenuService class.
 
     Returns:
-        A dictionary with the counts of submenus and dishes for the given menu ID.
+        The cached JSON body with the counts of submenus and dishes for the given menu ID,
+        or 304 Not Modified when the client ETag is still current.
     """
-    return await menu.get_complex_query(id)
+    cached = await menu.count(id, if_none_match)
+    return cached_response(cached)
 
 
 @router.get(
@@ -152,13 +182,20 @@ async def get_menu_counts(id: UUID4, menu: MenuService = Depends()) -> dict[str,
     name='Вывести все меню',
 )
 async def get_all_menus(
+    accept: str | None = Header(default=None),
     menu: MenuService = Depends(),
-):
+) -> StreamingResponse:
     """
-    A function to get all menus from the menu service.
+    A function to stream all menus with their submenus and dishes from the menu service.
 
     Parameters:
+    - accept: str | None - with application/x-ndjson every menu is sent as its own line,
+      otherwise the menus are sent as one JSON array
     - menu: MenuService - an instance of the MenuService class
 
     """
-    return await menu.get_all_menus()
+    ndjson = accept is not None and NDJSON_MEDIA_TYPE in accept
+    return StreamingResponse(
+        menu.stream_all_menus(ndjson),
+        media_type=NDJSON_MEDIA_TYPE if ndjson else 'application/json',
+    )
@@ -0,0 +1,37 @@
+from fastapi import HTTPException, Query, status
+from pydantic import UUID4
+
+from app.config import Config
+from app.repository.exceptions import InvalidCursorException
+from app.repository.pagination import decode_cursor
+
+config = Config()
+
+
+class PageParams:
+    """
+    Keyset page of a list: up to ``limit`` items with ids after the cursor.
+
+    Only pages of the default size that start at the beginning or at a cursor
+    the server issued are ``cached``, so clients can not fill the cache with
+    pages of every size after arbitrary ids.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(default=config.PAGE_DEFAULT_LIMIT, ge=1, le=config.PAGE_MAX_LIMIT),
+        cursor: str | None = Query(
+            default=None, description='X-Next-Cursor header of the previous page'
+        ),
+    ):
+        self.limit = limit
+        self.after: UUID4 | None = None
+        self.cached = limit == config.PAGE_DEFAULT_LIMIT
+        if cursor is not None:
+            try:
+                self.after, issued = decode_cursor(cursor)
+            except InvalidCursorException:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail='invalid cursor'
+                )
+            self.cached = self.cached and issued
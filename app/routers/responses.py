@@ -0,0 +1,15 @@
+from fastapi import Response, status
+
+from app.cache.redis import CachedBody
+from app.config import Config
+
+config = Config()
+
+
+def cached_response(cached: CachedBody) -> Response:
+    headers = {'ETag': cached.etag, 'Cache-Control': config.HTTP_CACHE_CONTROL}
+    if cached.next_cursor is not None:
+        headers['X-Next-Cursor'] = cached.next_cursor
+    if cached.body is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type='application/json', headers=headers)
@@ -1,14 +1,27 @@
 from typing import Any
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    status,
+)
+from fastapi.responses import JSONResponse, Response
 from pydantic import UUID4
 
+from app.config import Config
 from app.database.models import Submenu
-from app.repository.exceptions import SubmenuExistsException
+from app.repository.exceptions import MenuExistsException, SubmenuExistsException
+from app.routers.pagination import PageParams
+from app.routers.responses import cached_response
 from app.schemas import schemas
 from app.services.submenu import SubmenuService
 
+config = Config()
+
 router = APIRouter(
     tags=['submenu'],
     prefix='/api/v1/menus',
@@ -22,19 +35,29 @@ router = APIRouter(
     name='Просмотр списка подменю',
 )
 async def get_submenu_list(
-    menu_id: UUID4, submenu: SubmenuService = Depends()
-) -> list[Submenu]:
+    menu_id: UUID4,
+    page: PageParams = Depends(),
+    if_none_match: str | None = Header(default=None),
+    submenu: SubmenuService = Depends(),
+) -> Response:
     """
     Asynchronously retrieves a list of submenus for the given menu_id.
 
     Args:
         menu_id (UUID4): The ID of the menu for which the submenus are being retrieved.
+        page (PageParams): The limit and cursor of the requested page.
+        if_none_match (str, optional): ETag of the list the client already has.
         submenu (SubmenuService): An instance of SubmenuService obtained from the dependency injection system.
 
     Returns:
-        list[Submenu]: A list of submenus associated with the given menu_id.
+        Response: The cached JSON page of submenus of the given menu_id ordered by id,
+        with the cursor of the next page in the X-Next-Cursor header,
+        or 304 Not Modified when the client ETag is still current.
     """
-    return await submenu.get_submenu_list(menu_id)
+    cached = await submenu.get_submenu_list(
+        menu_id, page.limit, page.after, if_none_match, page.cached
+    )
+    return cached_response(cached)
 
 
 @router.post(
@@ -64,6 +87,78 @@ async def add_submenu(
     return await submenu.create(menu_id, data, background_tasks)
 
 
+@router.post(
+    '/{menu_id}/submenus/bulk',
+    response_model=schemas.BulkResult,
+    responses={404: {'model': schemas.NotFoundError}},
+    name='Создать подменю пакетом',
+)
+async def add_submenus_bulk(
+    menu_id: UUID4,
+    background_tasks: BackgroundTasks,
+    data: list[schemas.SubmenuCreate] = Body(min_length=1, max_length=config.BULK_MAX_ITEMS),
+    submenu: SubmenuService = Depends(),
+) -> schemas.BulkResult:
+    """
+    Create a batch of submenus in the menu with a single INSERT.
+
+    Returns:
+        schemas.BulkResult: The id of every created submenu in the order of the request.
+    """
+    try:
+        return await submenu.bulk_create(menu_id, data, background_tasks)
+    except MenuExistsException:
+        raise HTTPException(status_code=404, detail='menu not found')
+
+
+@router.patch(
+    '/{menu_id}/submenus/bulk',
+    response_model=schemas.BulkResult,
+    responses={404: {'model': schemas.NotFoundError}},
+    name='Обновить подменю пакетом',
+)
+async def update_submenus_bulk(
+    menu_id: UUID4,
+    background_tasks: BackgroundTasks,
+    data: list[schemas.SubmenuBulkUpdate] = Body(min_length=1, max_length=config.BULK_MAX_ITEMS),
+    submenu: SubmenuService = Depends(),
+) -> schemas.BulkResult:
+    """
+    Update a batch of submenus of the menu, identified by their ids, with a single UPDATE.
+
+    Returns:
+        schemas.BulkResult: The result of every item in the order of the request.
+    """
+    try:
+        return await submenu.bulk_update(menu_id, data, background_tasks)
+    except MenuExistsException:
+        raise HTTPException(status_code=404, detail='menu not found')
+
+
+@router.delete(
+    '/{menu_id}/submenus/bulk',
+    response_model=schemas.BulkResult,
+    responses={404: {'model': schemas.NotFoundError}},
+    name='Удалить подменю пакетом',
+)
+async def delete_submenus_bulk(
+    menu_id: UUID4,
+    background_tasks: BackgroundTasks,
+    data: list[UUID4] = Body(min_length=1, max_length=config.BULK_MAX_ITEMS),
+    submenu: SubmenuService = Depends(),
+) -> schemas.BulkResult:
+    """
+    Delete a batch of submenus of the menu, with their dishes, by their ids with a single DELETE.
+
+    Returns:
+        schemas.BulkResult: The result of every item in the order of the request.
+    """
+    try:
+        return await submenu.bulk_delete(menu_id, data, background_tasks)
+    except MenuExistsException:
+        raise HTTPException(status_code=404, detail='menu not found')
+
+
 @router.get(
     '/{menu_id}/submenus/{submenu_id}/',
     response_model=schemas.Submenu,
@@ -71,22 +166,26 @@ async def add_submenu(
     name='Просмотр подменю по id',
 )
 async def get_submenu(
-    menu_id: UUID4, submenu_id: UUID4, submenu: SubmenuService = Depends()
-) -> dict[Submenu, Any]:
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    if_none_match: str | None = Header(default=None),
+    submenu: SubmenuService = Depends(),
+) -> Response:
     """
     A function to get a submenu by menu_id and submenu_id using SubmenuService dependency.
     Parameters:
         - menu_id: UUID4
         - submenu_id: UUID4
+        - if_none_match: str | None
         - submenu: SubmenuService
     Returns:
-        - dict[Submenu, Any]
+        - Response with the cached JSON body of the submenu, or 304 Not Modified
     """
     try:
-        result = await submenu.get(menu_id, submenu_id)
+        cached = await submenu.get(menu_id, submenu_id, if_none_match)
     except SubmenuExistsException:
         raise HTTPException(status_code=404, detail='submenu not found')
-    return result
+    return cached_response(cached)
 
 
 @router.patch(
@@ -51,6 +51,10 @@ class SubmenuUpdate(BaseModel):
     description: str
 
 
+class SubmenuBulkUpdate(SubmenuUpdate):
+    id: UUID4
+
+
 class Dishes(BaseModel):
     id: UUID4
     title: str
@@ -79,6 +83,20 @@ class DishesUpdate(BaseModel):
         from_attributes = True
 
 
+class DishesBulkUpdate(DishesUpdate):
+    id: UUID4
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: UUID4 | None = None
+    error: str | None = None
+
+
+class BulkResult(BaseModel):
+    items: list[BulkItemResult]
+
+
 class Cache(BaseModel):
     key: str
 
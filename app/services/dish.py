@@ -1,30 +1,69 @@
 from fastapi import BackgroundTasks, Depends
 from pydantic import UUID4
 
-from app.cache.redis import cache_instance
+from app.cache.redis import CachedBody, cache_instance
+from app.config import Config
 from app.database.models import Dishes
 from app.repository.dishes_repo import DishesRepository
 from app.schemas import schemas
 
+config = Config()
+
 
 class DishesService:
     def __init__(self, repository: DishesRepository = Depends()):
         self.repository = repository
         self.cache = cache_instance
+        self.render_json = config.SQL_JSON_RENDERING
 
-    async def get_dishes_list(self, menu_id: UUID4, submenu_id: UUID4) -> list[Dishes]:
-        return await self.cache.fetch(
-            f'menu_{menu_id}_submenu_{submenu_id}_dish',
-            self.repository.get_dishes_list,
+    async def get_dishes_list(
+        self,
+        menu_id: UUID4,
+        submenu_id: UUID4,
+        limit: int,
+        after: UUID4 | None = None,
+        if_none_match: str | None = None,
+        cached: bool = True,
+    ) -> CachedBody:
+        return await self.cache.fetch_page(
+            f'menu_{menu_id}_submenu_{submenu_id}_dish_page_{limit}_{after or "start"}',
+            list[schemas.Dishes],
+            self.repository.get_dishes_list_json
+            if self.render_json
+            else self.repository.get_dishes_list,
             submenu_id,
+            limit,
+            after,
+            tags=[
+                f'submenu_{submenu_id}_dishes',
+                f'submenu_{submenu_id}_tree',
+                f'menu_{menu_id}_tree',
+            ],
+            namespace='dish',
+            if_none_match=if_none_match,
+            store=cached,
         )
 
-    async def get(self, menu_id: UUID4, submenu_id: UUID4, dish_id: UUID4) -> Dishes:
-        return await self.cache.fetch(
+    async def get(
+        self,
+        menu_id: UUID4,
+        submenu_id: UUID4,
+        dish_id: UUID4,
+        if_none_match: str | None = None,
+    ) -> CachedBody:
+        return await self.cache.fetch_response(
             f'menu_{menu_id}_submenu_{submenu_id}_dish_{dish_id}',
+            schemas.Dishes,
             self.repository.get_dish,
             submenu_id,
             dish_id,
+            tags=[
+                f'dish_{dish_id}',
+                f'submenu_{submenu_id}_tree',
+                f'menu_{menu_id}_tree',
+            ],
+            namespace='dish',
+            if_none_match=if_none_match,
         )
 
     async def create(
@@ -35,9 +74,14 @@ class DishesService:
         background_tasks: BackgroundTasks,
     ) -> Dishes:
         menu = await self.repository.create_dish(submenu_id, schema)
-        background_tasks.add_task(
-            self.cache.invalidate, f'menu_{menu_id}_submenu_{submenu_id}_dish'
-        )
+        tags = [
+            f'submenu_{submenu_id}_dishes',
+            f'submenu_{submenu_id}',
+            f'menu_{menu_id}_submenus',
+            f'menu_{menu_id}',
+        ]
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
         return menu
 
     async def update(
@@ -50,11 +94,9 @@ class DishesService:
     ) -> type[schemas.Dishes]:
         item = await self.repository.update_dish(submenu_id, dish_id, schema)
         item.price = f'{float(item.price):.2f}'
-        background_tasks.add_task(
-            self.cache.invalidate,
-            f'menu_{menu_id}_submenu_{submenu_id}_dish',
-            f'menu_{menu_id}_submenu_{submenu_id}_dish_{dish_id}',
-        )
+        tags = [f'submenu_{submenu_id}_dishes', f'dish_{dish_id}']
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
         return item
 
     async def delete(
@@ -65,8 +107,70 @@ class DishesService:
         background_tasks: BackgroundTasks,
     ) -> None:
         await self.repository.delete_dish(submenu_id, dish_id)
-        background_tasks.add_task(
-            self.cache.invalidate,
-            f'menu_{menu_id}_submenu_{submenu_id}_dish',
-            f'menu_{menu_id}_submenu_{submenu_id}_dish_{dish_id}',
-        )
+        tags = [
+            f'submenu_{submenu_id}_dishes',
+            f'submenu_{submenu_id}',
+            f'menu_{menu_id}_submenus',
+            f'menu_{menu_id}',
+            f'dish_{dish_id}',
+        ]
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
+
+    async def bulk_create(
+        self,
+        menu_id: UUID4,
+        submenu_id: UUID4,
+        items: list[schemas.DishesCreate],
+        background_tasks: BackgroundTasks,
+    ) -> schemas.BulkResult:
+        results = await self.repository.bulk_create(menu_id, submenu_id, items)
+        if any(result.error is None for result in results):
+            tags = [
+                f'submenu_{submenu_id}_dishes',
+                f'submenu_{submenu_id}',
+                f'menu_{menu_id}_submenus',
+                f'menu_{menu_id}',
+            ]
+            await self.cache.bump(tags)
+            background_tasks.add_task(self.cache.invalidate, tags=tags)
+        return schemas.BulkResult(items=results)
+
+    async def bulk_update(
+        self,
+        menu_id: UUID4,
+        submenu_id: UUID4,
+        items: list[schemas.DishesBulkUpdate],
+        background_tasks: BackgroundTasks,
+    ) -> schemas.BulkResult:
+        results = await self.repository.bulk_update(menu_id, submenu_id, items)
+        updated = [result.id for result in results if result.error is None]
+        if updated:
+            tags = [
+                f'submenu_{submenu_id}_dishes',
+                *(f'dish_{dish_id}' for dish_id in updated),
+            ]
+            await self.cache.bump(tags)
+            background_tasks.add_task(self.cache.invalidate, tags=tags)
+        return schemas.BulkResult(items=results)
+
+    async def bulk_delete(
+        self,
+        menu_id: UUID4,
+        submenu_id: UUID4,
+        ids: list[UUID4],
+        background_tasks: BackgroundTasks,
+    ) -> schemas.BulkResult:
+        results = await self.repository.bulk_delete(menu_id, submenu_id, ids)
+        deleted = [result.id for result in results if result.error is None]
+        if deleted:
+            tags = [
+                f'submenu_{submenu_id}_dishes',
+                f'submenu_{submenu_id}',
+                f'menu_{menu_id}_submenus',
+                f'menu_{menu_id}',
+                *(f'dish_{dish_id}' for dish_id in deleted),
+            ]
+            await self.cache.bump(tags)
+            background_tasks.add_task(self.cache.invalidate, tags=tags)
+        return schemas.BulkResult(items=results)
@@ -1,12 +1,17 @@
+from collections.abc import AsyncIterator
 from typing import Any
 
 from fastapi import BackgroundTasks, Depends
 from pydantic import UUID4
 
-from app.cache.redis import cache_instance
+from app.cache.codecs import JsonCodec
+from app.cache.redis import CachedBody, cache_instance
+from app.config import Config
 from app.repository.exceptions import MenuExistsException
 from app.repository.menu_repo import MenuRepository
-from app.schemas.schemas import Menu, MenuCreate, MenuUpdate
+from app.schemas.schemas import Menu, MenuCreate, MenuItem, MenuUpdate
+
+config = Config()
 
 
 class MenuService:
@@ -14,15 +19,39 @@ class MenuService:
     def __init__(self, repository: MenuRepository = Depends()):
         self.repository = repository
         self.cache = cache_instance
+        self.codec = JsonCodec()
+        self.render_json = config.SQL_JSON_RENDERING
 
-    async def get_menu_list(self):
-        return await self.cache.fetch('menu', self.repository.get_menu_list)
+    async def get_menu_list(
+        self,
+        limit: int,
+        after: UUID4 | None = None,
+        if_none_match: str | None = None,
+        cached: bool = True,
+    ) -> CachedBody:
+        return await self.cache.fetch_page(
+            f'menu_page_{limit}_{after or "start"}',
+            list[MenuItem],
+            self.repository.get_menu_list_json
+            if self.render_json
+            else self.repository.get_menu_list,
+            limit,
+            after,
+            tags=['menus'],
+            namespace='menu',
+            if_none_match=if_none_match,
+            store=cached,
+        )
 
-    async def get(self, menu_id: UUID4) -> Menu:
-        return await self.cache.fetch(
+    async def get(self, menu_id: UUID4, if_none_match: str | None = None) -> CachedBody:
+        return await self.cache.fetch_response(
             f'menu_{menu_id}',
+            Menu,
             self.repository.get_menu,
             menu_id,
+            tags=[f'menu_{menu_id}'],
+            namespace='menu',
+            if_none_match=if_none_match,
         )
 
     async def create(
@@ -31,7 +60,9 @@ class MenuService:
         background_tasks: BackgroundTasks,
     ) -> Menu:
         menu = await self.repository.create_menu(menu_schema)
-        background_tasks.add_task(self.cache.invalidate, 'menu')
+        tags = ['menus']
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
         return menu
 
     async def update(
@@ -41,7 +72,9 @@ class MenuService:
         background_tasks: BackgroundTasks,
     ) -> type[Menu]:
         item = await self.repository.update_menu(menu_id, menu_schema)
-        background_tasks.add_task(self.cache.invalidate, 'menu', f'menu_{menu_id}')
+        tags = ['menus', f'menu_{menu_id}']
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
         return item
 
     async def delete(
@@ -50,11 +83,21 @@ class MenuService:
         background_tasks: BackgroundTasks,
     ) -> None:
         await self.repository.delete(menu_id)
-        background_tasks.add_task(self.cache.invalidate, 'menu', f'menu_{menu_id}*')
+        tags = ['menus', f'menu_{menu_id}', f'menu_{menu_id}_tree']
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
 
-    async def count(self, menu_id: UUID4) -> Menu:
-        return await self.cache.fetch(
-            f'menu_{menu_id}_count', self.get_complex_query, menu_id
+    async def count(
+        self, menu_id: UUID4, if_none_match: str | None = None
+    ) -> CachedBody:
+        return await self.cache.fetch_response(
+            f'menu_{menu_id}_count',
+            Menu,
+            self.get_complex_query,
+            menu_id,
+            tags=[f'menu_{menu_id}'],
+            namespace='menu',
+            if_none_match=if_none_match,
         )
 
     async def get_complex_query(self, menu_id: UUID4) -> dict[str, Any]:
@@ -71,6 +114,21 @@ class MenuService:
         }
         return menu_dict
 
-    async def get_all_menus(self) -> list:
-        all_menus = await self.repository.get_all_menus()
-        return all_menus
+    async def stream_all_menus(self, ndjson: bool = False) -> AsyncIterator[bytes]:
+        """
+        Encodes the menu tree as it is read, one menu per line for NDJSON or
+        as the chunks of a single JSON array otherwise.
+        """
+        if self.render_json:
+            menus = self.repository.stream_all_menus_json()
+        else:
+            menus = (self.codec.dumps(menu) async for menu in self.repository.stream_all_menus())
+        if ndjson:
+            async for menu in menus:
+                yield menu + b'\n'
+            return
+        separator = b'['
+        async for menu in menus:
+            yield separator + menu
+            separator = b','
+        yield b'[]' if separator == b'[' else b']'
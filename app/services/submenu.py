@@ -1,30 +1,56 @@
 from fastapi import BackgroundTasks, Depends
 from pydantic import UUID4
 
-from app.cache.redis import cache_instance
+from app.cache.redis import CachedBody, cache_instance
+from app.config import Config
 from app.database.models import Submenu
 from app.repository.submenu_repo import SubmenuRepositary
 from app.schemas import schemas
 
+config = Config()
+
 
 class SubmenuService:
     def __init__(self, repository: SubmenuRepositary = Depends()):
         self.repository = repository
         self.cache = cache_instance
+        self.render_json = config.SQL_JSON_RENDERING
 
-    async def get_submenu_list(self, menu_id: UUID4) -> list[Submenu]:
-        return await self.cache.fetch(
-            f'menu_{menu_id}_submenu',
-            self.repository.get_submenu_list,
+    async def get_submenu_list(
+        self,
+        menu_id: UUID4,
+        limit: int,
+        after: UUID4 | None = None,
+        if_none_match: str | None = None,
+        cached: bool = True,
+    ) -> CachedBody:
+        return await self.cache.fetch_page(
+            f'menu_{menu_id}_submenu_page_{limit}_{after or "start"}',
+            list[schemas.Submenu],
+            self.repository.get_submenu_list_json
+            if self.render_json
+            else self.repository.get_submenu_list,
             menu_id,
+            limit,
+            after,
+            tags=[f'menu_{menu_id}_submenus', f'menu_{menu_id}_tree'],
+            namespace='submenu',
+            if_none_match=if_none_match,
+            store=cached,
         )
 
-    async def get(self, menu_id: UUID4, submenu_id: UUID4) -> Submenu:
-        return await self.cache.fetch(
+    async def get(
+        self, menu_id: UUID4, submenu_id: UUID4, if_none_match: str | None = None
+    ) -> CachedBody:
+        return await self.cache.fetch_response(
             f'menu_{menu_id}_submenu_{submenu_id}',
+            schemas.Submenu,
             self.repository.get_sub,
             menu_id,
             submenu_id,
+            tags=[f'submenu_{submenu_id}', f'menu_{menu_id}_tree'],
+            namespace='submenu',
+            if_none_match=if_none_match,
         )
 
     async def create(
@@ -34,7 +60,9 @@ class SubmenuService:
         background_tasks: BackgroundTasks,
     ) -> Submenu:
         menu = await self.repository.create_submenu(menu_id, schema)
-        background_tasks.add_task(self.cache.invalidate, f'menu_{menu_id}_submenu')
+        tags = [f'menu_{menu_id}_submenus', f'menu_{menu_id}']
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
         return menu
 
     async def update(
@@ -45,11 +73,9 @@ class SubmenuService:
         background_tasks: BackgroundTasks,
     ) -> type[Submenu]:
         item = await self.repository.update_submenu(menu_id, submenu_id, schema)
-        background_tasks.add_task(
-            self.cache.invalidate,
-            f'menu_{menu_id}_submenu',
-            f'menu_{menu_id}_submenu_{submenu_id}',
-        )
+        tags = [f'menu_{menu_id}_submenus', f'submenu_{submenu_id}']
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
         return item
 
     async def delete(
@@ -59,8 +85,56 @@ class SubmenuService:
         background_tasks: BackgroundTasks,
     ) -> None:
         await self.repository.delete_submenu(menu_id, submenu_id)
-        background_tasks.add_task(
-            self.cache.invalidate,
-            f'menu_{menu_id}_submenu',
-            f'menu_{menu_id}_submenu_{submenu_id}*',
-        )
+        tags = [
+            f'menu_{menu_id}_submenus',
+            f'menu_{menu_id}',
+            f'submenu_{submenu_id}',
+            f'submenu_{submenu_id}_tree',
+        ]
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
+
+    async def bulk_create(
+        self,
+        menu_id: UUID4,
+        items: list[schemas.SubmenuCreate],
+        background_tasks: BackgroundTasks,
+    ) -> schemas.BulkResult:
+        results = await self.repository.bulk_create(menu_id, items)
+        tags = [f'menu_{menu_id}_submenus', f'menu_{menu_id}']
+        await self.cache.bump(tags)
+        background_tasks.add_task(self.cache.invalidate, tags=tags)
+        return schemas.BulkResult(items=results)
+
+    async def bulk_update(
+        self,
+        menu_id: UUID4,
+        items: list[schemas.SubmenuBulkUpdate],
+        background_tasks: BackgroundTasks,
+    ) -> schemas.BulkResult:
+        results = await self.repository.bulk_update(menu_id, items)
+        updated = [result.id for result in results if result.error is None]
+        if updated:
+            tags = [
+                f'menu_{menu_id}_submenus',
+                *(f'submenu_{submenu_id}' for submenu_id in updated),
+            ]
+            await self.cache.bump(tags)
+            background_tasks.add_task(self.cache.invalidate, tags=tags)
+        return schemas.BulkResult(items=results)
+
+    async def bulk_delete(
+        self,
+        menu_id: UUID4,
+        ids: list[UUID4],
+        background_tasks: BackgroundTasks,
+    ) -> schemas.BulkResult:
+        results = await self.repository.bulk_delete(menu_id, ids)
+        deleted = [result.id for result in results if result.error is None]
+        if deleted:
+            tags = [f'menu_{menu_id}_submenus', f'menu_{menu_id}']
+            for submenu_id in deleted:
+                tags += [f'submenu_{submenu_id}', f'submenu_{submenu_id}_tree']
+            await self.cache.bump(tags)
+            background_tasks.add_task(self.cache.invalidate, tags=tags)
+        return schemas.BulkResult(items=results)
@@ -1,16 +1,17 @@
 import asyncio
-from typing import AsyncGenerator, AsyncIterator
+from typing import AsyncGenerator, AsyncIterator, Iterator
 
 import pytest
 from httpx import AsyncClient
 from pydantic import UUID4
-from sqlalchemy import NullPool, create_engine, text
+from sqlalchemy import NullPool, create_engine, event, text
 from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.cache.redis import cache_instance
 from app.config import Config
 from app.database.db import Base, get_session
+from app.database.migrations import migrate
 from app.main import app
 
 config = Config()
@@ -80,8 +81,20 @@ def anyio_backend() -> str:
 
 
 @pytest.fixture
-def prepare_cache():
-    cache_instance.redis_client.flushall()
+async def prepare_cache():
+    await cache_instance.flush()
+
+
+@pytest.fixture
+def queries() -> Iterator[list[str]]:
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(test_engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
 
 
 @pytest.fixture(autouse=True, scope='session')
@@ -89,6 +102,7 @@ async def prepare_database():
     db_prep()
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await migrate(test_engine)
     yield
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
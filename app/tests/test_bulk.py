@@ -0,0 +1,227 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from pydantic import UUID4
+
+from app.routers import dishes_router, menu_router, submenu_router
+from app.tests.test_menu import MENU_CREATE_DATA
+from app.tests.test_submenu import SUBMENU_CREATE_DATA
+from app.tests.utils import reverse
+
+DISHES_BULK_DATA = [
+    {'title': 'Bulk dish 1', 'description': 'Bulk description 1', 'price': '10.5'},
+    {'title': 'Bulk dish 2', 'description': 'Bulk description 2', 'price': '20.123'},
+    {'title': 'Bulk dish 1', 'description': 'Same title', 'price': '30'},
+]
+
+
+@pytest.mark.asyncio
+async def test_add_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.post(reverse(menu_router.add_menu), json=MENU_CREATE_DATA)
+    menu_id = response.json()['id']
+    response = await client.post(
+        reverse(submenu_router.add_submenu, menu_id=menu_id), json=SUBMENU_CREATE_DATA
+    )
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_add_dishes_bulk(
+    client: AsyncClient, menu_id: UUID4, submenu_id: UUID4, queries: list[str]
+) -> None:
+    list_url = reverse(dishes_router.get_dishes_list, menu_id=menu_id, submenu_id=submenu_id)
+    response = await client.get(list_url)
+    assert response.json() == []
+
+    queries.clear()
+    response = await client.post(
+        reverse(dishes_router.add_dishes_bulk, menu_id=menu_id, submenu_id=submenu_id),
+        json=DISHES_BULK_DATA,
+    )
+    assert response.status_code == 200
+    items = response.json()['items']
+    assert [item['index'] for item in items] == [0, 1, 2]
+    assert [item['error'] for item in items] == [None, None, 'dish title already exists']
+    assert items[2]['id'] is None
+    assert len([query for query in queries if query.lstrip().startswith('INSERT')]) == 1
+
+    response = await client.get(list_url)
+    dishes = {dish['id']: dish for dish in response.json()}
+    assert dishes.keys() == {items[0]['id'], items[1]['id']}
+    assert dishes[items[1]['id']]['price'] == '20.12'
+
+    response = await client.get(
+        reverse(submenu_router.get_submenu, menu_id=menu_id, submenu_id=submenu_id)
+    )
+    assert response.json()['dishes_count'] == 2
+
+
+@pytest.mark.asyncio
+async def test_update_dishes_bulk(
+    client: AsyncClient, menu_id: UUID4, submenu_id: UUID4, dish_id: UUID4
+) -> None:
+    missing_id = str(uuid.uuid4())
+    data = [
+        {'id': dish_id, 'title': 'Bulk dish 3', 'description': 'Updated', 'price': '1.999'},
+        {'id': missing_id, 'title': 'Bulk dish 4', 'description': 'Updated', 'price': '1'},
+        {'id': dish_id, 'title': 'Bulk dish 5', 'description': 'Updated', 'price': '1'},
+    ]
+    response = await client.patch(
+        reverse(dishes_router.update_dishes_bulk, menu_id=menu_id, submenu_id=submenu_id),
+        json=data,
+    )
+    assert response.status_code == 200
+    assert response.json()['items'] == [
+        {'index': 0, 'id': dish_id, 'error': None},
+        {'index': 1, 'id': missing_id, 'error': 'dish not found'},
+        {'index': 2, 'id': dish_id, 'error': 'duplicate item in batch'},
+    ]
+
+    response = await client.get(
+        reverse(dishes_router.get_dish, menu_id=menu_id, submenu_id=submenu_id, dish_id=dish_id)
+    )
+    dish = response.json()
+    assert dish['title'] == 'Bulk dish 3'
+    assert float(dish['price']) == 2.0
+
+
+@pytest.mark.asyncio
+async def test_swap_dish_titles_bulk(
+    client: AsyncClient, menu_id: UUID4, submenu_id: UUID4
+) -> None:
+    list_url = reverse(dishes_router.get_dishes_list, menu_id=menu_id, submenu_id=submenu_id)
+    first, second = (await client.get(list_url)).json()
+    data = [
+        {'id': first['id'], 'title': second['title'], 'description': 'Swapped', 'price': '1'},
+        {'id': second['id'], 'title': first['title'], 'description': 'Swapped', 'price': '1'},
+    ]
+    response = await client.patch(
+        reverse(dishes_router.update_dishes_bulk, menu_id=menu_id, submenu_id=submenu_id),
+        json=data,
+    )
+    assert response.status_code == 200
+    assert [item['error'] for item in response.json()['items']] == [None, None]
+    titles = {dish['id']: dish['title'] for dish in (await client.get(list_url)).json()}
+    assert titles == {first['id']: second['title'], second['id']: first['title']}
+
+
+@pytest.mark.asyncio
+async def test_bulk_unknown_submenu(client: AsyncClient, menu_id: UUID4) -> None:
+    response = await client.post(
+        reverse(dishes_router.add_dishes_bulk, menu_id=menu_id, submenu_id=uuid.uuid4()),
+        json=DISHES_BULK_DATA,
+    )
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'submenu not found'}
+
+
+@pytest.mark.asyncio
+async def test_bulk_empty_batch(client: AsyncClient, menu_id: UUID4, submenu_id: UUID4) -> None:
+    response = await client.post(
+        reverse(dishes_router.add_dishes_bulk, menu_id=menu_id, submenu_id=submenu_id),
+        json=[],
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_delete_dishes_bulk(
+    client: AsyncClient, menu_id: UUID4, submenu_id: UUID4
+) -> None:
+    list_url = reverse(dishes_router.get_dishes_list, menu_id=menu_id, submenu_id=submenu_id)
+    ids = [dish['id'] for dish in (await client.get(list_url)).json()]
+    missing_id = str(uuid.uuid4())
+    response = await client.request(
+        'DELETE',
+        reverse(dishes_router.delete_dishes_bulk, menu_id=menu_id, submenu_id=submenu_id),
+        json=[*ids, missing_id],
+    )
+    assert response.status_code == 200
+    assert [item['error'] for item in response.json()['items']] == [
+        None,
+        None,
+        'dish not found',
+    ]
+    assert (await client.get(list_url)).json() == []
+
+
+@pytest.mark.asyncio
+async def test_dishes_bulk_invalid_price(
+    client: AsyncClient, menu_id: UUID4, submenu_id: UUID4
+) -> None:
+    response = await client.post(
+        reverse(dishes_router.add_dishes_bulk, menu_id=menu_id, submenu_id=submenu_id),
+        json=[
+            {'title': 'Priced dish', 'description': 'Description', 'price': '12.5'},
+            {'title': 'Unpriced dish', 'description': 'Description', 'price': 'free'},
+            {'title': 'Expensive dish', 'description': 'Description', 'price': 10**9},
+        ],
+    )
+    assert response.status_code == 200
+    items = response.json()['items']
+    assert [item['error'] for item in items] == [None, 'invalid price', 'invalid price']
+
+    response = await client.patch(
+        reverse(dishes_router.update_dishes_bulk, menu_id=menu_id, submenu_id=submenu_id),
+        json=[
+            {'id': items[0]['id'], 'title': 'Priced dish', 'description': 'Updated', 'price': 'NaN'},
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json()['items'] == [{'index': 0, 'id': items[0]['id'], 'error': 'invalid price'}]
+    list_url = reverse(dishes_router.get_dishes_list, menu_id=menu_id, submenu_id=submenu_id)
+    dishes = {dish['id']: dish for dish in (await client.get(list_url)).json()}
+    assert dishes.keys() == {items[0]['id']}
+    assert dishes[items[0]['id']]['price'] == '12.50'
+
+
+@pytest.mark.asyncio
+async def test_submenus_bulk(client: AsyncClient, menu_id: UUID4) -> None:
+    list_url = reverse(submenu_router.get_submenu_list, menu_id=menu_id)
+    response = await client.post(
+        reverse(submenu_router.add_submenus_bulk, menu_id=menu_id),
+        json=[SUBMENU_CREATE_DATA, SUBMENU_CREATE_DATA],
+    )
+    assert response.status_code == 200
+    created = [item['id'] for item in response.json()['items']]
+    assert len(created) == 2
+    assert len((await client.get(list_url)).json()) == 3
+
+    response = await client.patch(
+        reverse(submenu_router.update_submenus_bulk, menu_id=menu_id),
+        json=[{'id': created[0], 'title': 'Bulk submenu', 'description': 'Updated'}],
+    )
+    assert response.json()['items'] == [{'index': 0, 'id': created[0], 'error': None}]
+    titles = [submenu['title'] for submenu in (await client.get(list_url)).json()]
+    assert 'Bulk submenu' in titles
+
+    response = await client.request(
+        'DELETE',
+        reverse(submenu_router.delete_submenus_bulk, menu_id=menu_id),
+        json=created,
+    )
+    assert [item['error'] for item in response.json()['items']] == [None, None]
+    assert len((await client.get(list_url)).json()) == 1
+
+    response = await client.get(reverse(menu_router.get_menu, id=menu_id))
+    assert response.json()['submenus_count'] == 1
+
+
+@pytest.mark.asyncio
+async def test_submenus_bulk_unknown_menu(client: AsyncClient) -> None:
+    url = reverse(submenu_router.update_submenus_bulk, menu_id=uuid.uuid4())
+    response = await client.patch(
+        url, json=[{'id': str(uuid.uuid4()), 'title': 'Bulk submenu', 'description': 'Updated'}]
+    )
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'menu not found'}
+    response = await client.request('DELETE', url, json=[str(uuid.uuid4())])
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'menu not found'}
+
+
+@pytest.mark.asyncio
+async def test_delete_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.get(reverse(menu_router.get_menu_list))
+    assert response.json() == []
@@ -0,0 +1,272 @@
+import asyncio
+import uuid
+from typing import AsyncIterator, Callable
+
+import pytest
+
+from app.cache.codecs import FLAG_ZLIB, HEADER, Envelope, JsonCodec, MsgpackCodec, RawCodec
+from app.cache.local import LocalCache
+from app.cache.redis import LOCK_PREFIX, TAG_PREFIX, VERSION_PREFIX, Cache
+from app.config import Config
+
+config = Config()
+
+
+@pytest.fixture
+async def caches() -> AsyncIterator[Callable[..., Cache]]:
+    created: list[Cache] = []
+
+    def create(**kwargs) -> Cache:
+        created.append(Cache(config.REDIS_HOST, config.REDIS_PORT, **kwargs))
+        return created[-1]
+
+    yield create
+    for cache in created:
+        await cache.close()
+
+
+@pytest.fixture
+def key() -> str:
+    return f'test_{uuid.uuid4().hex}'
+
+
+class Repository:
+    """Counts its calls and returns ``value``."""
+
+    def __init__(self, value: object, delay: float = 0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> object:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+@pytest.mark.asyncio
+async def test_tag_invalidation(caches: Callable[..., Cache], key: str) -> None:
+    cache = caches()
+    menu, submenu, tree = (f'{key}_{name}' for name in ('menu', 'submenu', 'tree'))
+    other = f'{key}_other'
+    await cache.fetch(key, Repository({'title': 'Menu'}), tags=[menu, tree])
+    await cache.fetch(other, Repository({'title': 'Submenu'}), tags=[submenu, tree])
+    assert await cache.redis_client.smembers(f'{TAG_PREFIX}{menu}') == {key.encode()}
+    assert await cache.redis_client.smembers(f'{TAG_PREFIX}{tree}') == {key.encode(), other.encode()}
+
+    await cache.invalidate(tags=[menu])
+    assert await cache.redis_client.exists(key, f'{TAG_PREFIX}{menu}') == 0
+    # Keys under other tags are left alone.
+    assert await cache.redis_client.exists(other, f'{TAG_PREFIX}{submenu}', f'{TAG_PREFIX}{tree}') == 3
+
+    await cache.invalidate(tags=[tree])
+    assert await cache.redis_client.exists(other, f'{TAG_PREFIX}{tree}') == 0
+
+    # Plain keys go with the tags, and a tag without a set is a no-op.
+    await cache.fetch(key, Repository({'title': 'Menu'}), tags=[menu])
+    await cache.invalidate(key, tags=[f'{key}_unknown'])
+    assert await cache.redis_client.exists(key) == 0
+
+
+async def subscribe(*caches: Cache) -> None:
+    """Starts the listeners of ``caches`` and waits until they all receive messages."""
+    for cache in caches:
+        await cache.start()
+    for _ in range(100):
+        [(_, subscribers)] = await caches[0].redis_client.pubsub_numsub(caches[0].channel)
+        if subscribers == len(caches):
+            break
+        await asyncio.sleep(0.01)
+    # The listeners clear their tier right after they subscribe.
+    await asyncio.sleep(0.1)
+
+
+def test_local_cache_eviction() -> None:
+    local = LocalCache(max_entries=2, max_bytes=100, ttl=60)
+    local.set('a', 'a', 10, tags=['tag'])
+    local.set('b', 'b', 10)
+    assert local.get('a') == 'a'
+    # b is the least recently used entry.
+    local.set('c', 'c', 10)
+    assert local.get('b') is None
+    assert local.get('a') == 'a'
+
+    local.set('too large', 'value', 101)
+    assert local.get('too large') is None
+    # Over the size budget, the least recently used entries go first.
+    local.set('d', 'd', 90)
+    assert local.get('c') is None
+    assert (local.get('a'), local.get('d'), local.size) == ('a', 'd', 100)
+
+    local.invalidate(tags=['tag'])
+    assert local.get('a') is None
+    assert (local.size, local.tags) == (90, {})
+
+    expired = LocalCache(max_entries=2, max_bytes=100, ttl=0)
+    expired.set('a', 'a', 10)
+    assert expired.get('a') is None
+
+
+@pytest.mark.asyncio
+async def test_local_cache_invalidation(caches: Callable[..., Cache], key: str) -> None:
+    channel = f'test-{uuid.uuid4().hex}'
+    first, second = (caches(local=LocalCache(16, 4096, 60), channel=channel) for _ in range(2))
+    await subscribe(first, second)
+
+    repository = Repository({'title': 'Menu'})
+    assert await first.fetch(key, repository, tags=['menu']) == {'title': 'Menu'}
+    assert await second.fetch(key, repository, tags=['menu']) == {'title': 'Menu'}
+    assert repository.calls == 1
+    assert second.local.get(key) == {'title': 'Menu'}
+
+    await first.invalidate(tags=['menu'])
+    assert first.local.get(key) is None
+    for _ in range(100):
+        if second.local.get(key) is None:
+            break
+        await asyncio.sleep(0.01)
+    assert second.local.get(key) is None
+    repository.value = {'title': 'Updated'}
+    assert await second.fetch(key, repository, tags=['menu']) == {'title': 'Updated'}
+
+
+@pytest.mark.asyncio
+async def test_versions(caches: Callable[..., Cache], key: str) -> None:
+    cache = caches(version_ttl=60)
+    version_key = f'{VERSION_PREFIX}{key}'
+    etag = await cache.etag(key, [key])
+    assert await cache.etag(key, [key]) == etag
+    assert 0 < await cache.redis_client.ttl(version_key) <= 60
+
+    await cache.bump([key])
+    bumped = await cache.etag(key, [key])
+    assert bumped != etag
+    assert 0 < await cache.redis_client.ttl(version_key) <= 60
+
+    # A version lost to a flush, an eviction or its TTL does not bring an old ETag back.
+    await cache.redis_client.delete(version_key)
+    assert await cache.etag(key, [key]) not in (etag, bumped)
+
+
+@pytest.mark.asyncio
+async def test_local_versions(caches: Callable[..., Cache], key: str) -> None:
+    channel = f'test-{uuid.uuid4().hex}'
+    first, second = (caches(local=LocalCache(16, 4096, 60), channel=channel) for _ in range(2))
+    await subscribe(first, second)
+    version_key = f'{VERSION_PREFIX}{key}'
+
+    etag = await second.etag(key, [key])
+    # The versions are read from the local tier, not from Redis.
+    await second.redis_client.delete(version_key)
+    assert await second.etag(key, [key]) == etag
+
+    await first.bump([key])
+    for _ in range(100):
+        if second.local.get(version_key) is None:
+            break
+        await asyncio.sleep(0.01)
+    assert await second.etag(key, [key]) == await first.etag(key, [key]) != etag
+
+
+@pytest.mark.asyncio
+async def test_single_flight(caches: Callable[..., Cache], key: str) -> None:
+    cache = caches()
+    repository = Repository({'title': 'Menu'}, delay=0.05)
+    results = await asyncio.gather(*(cache.fetch(key, repository) for _ in range(10)))
+    assert results == [{'title': 'Menu'}] * 10
+    assert repository.calls == 1
+    assert cache.inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_between_instances(caches: Callable[..., Cache], key: str) -> None:
+    first, second = caches(lock_poll_interval=0.01), caches(lock_poll_interval=0.01)
+    repository = Repository({'title': 'Menu'}, delay=0.1)
+    results = await asyncio.gather(first.fetch(key, repository), second.fetch(key, repository))
+    assert results == [{'title': 'Menu'}] * 2
+    # The second instance waited for the Redis lock and read the entry.
+    assert repository.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_error(caches: Callable[..., Cache], key: str) -> None:
+    cache = caches()
+    calls = 0
+
+    async def failing() -> None:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        raise LookupError(key)
+
+    results = await asyncio.gather(*(cache.fetch(key, failing) for _ in range(3)), return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(result, LookupError) for result in results)
+    assert cache.inflight == {}
+    assert await cache.redis_client.exists(f'{LOCK_PREFIX}{key}') == 0
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate(caches: Callable[..., Cache], key: str) -> None:
+    cache = caches(default_ttl=60, ttl_jitter=0, stale_while_revalidate=True, stale_ttl=30)
+    repository = Repository({'title': 'Menu'})
+    assert await cache.fetch(key, repository) == {'title': 'Menu'}
+    assert 60_000 < await cache.redis_client.pttl(key) <= 90_000
+
+    # Fresh entries are served without a refresh.
+    repository.value = {'title': 'Updated'}
+    assert await cache.fetch(key, repository) == {'title': 'Menu'}
+    assert cache.refreshing == {}
+
+    # Past its TTL the entry is still served, and refreshed in the background.
+    await cache.redis_client.pexpire(key, 10_000)
+    assert await cache.fetch(key, repository) == {'title': 'Menu'}
+    await asyncio.gather(*cache.refreshing.values())
+    assert repository.calls == 2
+    assert await cache.fetch(key, repository) == {'title': 'Updated'}
+    assert await cache.redis_client.pttl(key) > 60_000
+
+
+def test_ttl_jitter() -> None:
+    cache = Cache(config.REDIS_HOST, config.REDIS_PORT, ttl={'menu': 100}, default_ttl=10, ttl_jitter=0.1)
+    expiries = {cache._expiry('menu') for _ in range(200)}
+    assert min(expiries) >= 90 and max(expiries) <= 110
+    assert len(expiries) > 1
+    assert {cache._expiry(None) for _ in range(200)} <= set(range(9, 12))
+    # Tag sets outlive every entry they point to.
+    assert cache.max_expiry >= max(expiries)
+
+
+@pytest.mark.parametrize('codec', ['json', 'msgpack'])
+def test_envelope_round_trip(codec: str) -> None:
+    envelope = Envelope(codec, compression_threshold=1024)
+    menu_id = uuid.uuid4()
+    small = {'id': menu_id, 'title': 'Menu', 'price': 1.5, 'dishes': None}
+    large = [{'id': str(uuid.uuid4()), 'title': 'Dish', 'description': 'Description' * 10} for _ in range(50)]
+
+    data = envelope.encode(small)
+    assert HEADER.unpack_from(data)[2:] == (envelope.codec.id, 0)
+    assert envelope.decode(data) == {**small, 'id': str(menu_id)}
+
+    data = envelope.encode(large)
+    assert HEADER.unpack_from(data)[3] == FLAG_ZLIB
+    assert envelope.decode(data) == large
+    assert envelope.stats.compressed == 1
+    assert envelope.stats.bytes_saved > 0
+
+    # Rendered bodies are stored raw, and compressed the same way.
+    body = b'[' + b'{"title": "Dish"},' * 100 + b'{}]'
+    data = envelope.encode(body)
+    assert HEADER.unpack_from(data)[2:] == (RawCodec.id, FLAG_ZLIB)
+    assert envelope.decode(data) == body
+
+
+def test_envelope_reads_other_codecs() -> None:
+    value = {'title': 'Menu', 'submenus': [1, 2, 3]}
+    msgpack_entry = Envelope('msgpack').encode(value)
+    envelope = Envelope('json')
+    assert HEADER.unpack_from(msgpack_entry)[2] == MsgpackCodec.id
+    assert envelope.decode(msgpack_entry) == value
+    assert HEADER.unpack_from(envelope.encode(value))[2] == JsonCodec.id
+    # Entries written before the envelope are plain JSON.
+    assert envelope.decode(b'{"title": "Menu"}') == {'title': 'Menu'}
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from httpx import AsyncClient
 from pydantic import UUID4
@@ -104,6 +106,19 @@ async def test_all_data(
     ]
 
 
+@pytest.mark.asyncio
+async def test_all_data_ndjson(client: AsyncClient) -> None:
+    response = await client.get(reverse(menu_router.get_all_menus))
+    menus = response.json()
+    response = await client.get(
+        reverse(menu_router.get_all_menus),
+        headers={'Accept': 'application/x-ndjson'},
+    )
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in response.text.splitlines()] == menus
+
+
 @pytest.mark.asyncio
 async def test_add_dish_second(
     client: AsyncClient, menu_id: UUID4, submenu_id: UUID4
@@ -0,0 +1,155 @@
+from typing import Iterator
+
+import pytest
+from sqlalchemy import Engine, create_engine, make_url, text
+
+from app.celery.importer import (
+    TABLES,
+    ImportStats,
+    ImportValidationException,
+    apply_staged,
+    copy_batches,
+    import_catalog,
+    stage_delta,
+)
+from app.celery.parser import parse_rows, workbook_uuid
+from app.tests.conftest import testbase_url
+
+WORKBOOK_ROWS = [
+    (1, 'Import menu 1', 'Description'),
+    (None, 1, 'Import submenu 1.1', 'Description'),
+    (None, None, 1, 'Import dish 1.1.1', 'Description', 100, 90),
+    (None, None, 2, 'Import dish 1.1.2', 'Description', 200, 100),
+    (None, 2, 'Import submenu 1.2', 'Description'),
+    (None, None, 1, 'Import dish 1.2.1', 'Description', 300, 50),
+    (2, 'Import menu 2', 'Description'),
+    (None, 1, 'Import submenu 2.1', 'Description'),
+    (None, None, 1, 'Import dish 2.1.1', 'Description', 400, 100),
+]
+# A new price for dish 1.1.2.
+CHANGED_ROWS = [*WORKBOOK_ROWS[:3], (None, None, 2, 'Import dish 1.1.2', 'Description', 250, 100), *WORKBOOK_ROWS[4:]]
+# Without submenu 1.2 and its dish.
+REMOVED_ROWS = [*CHANGED_ROWS[:4], *CHANGED_ROWS[6:]]
+
+
+@pytest.fixture(scope='module')
+def engine() -> Iterator[Engine]:
+    # The importer runs in the Celery worker, on psycopg2.
+    engine = create_engine(make_url(testbase_url).set(drivername='postgresql+psycopg2'))
+    yield engine
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM menu WHERE title LIKE 'Import menu%'"))
+        connection.execute(text('DELETE FROM import_rows'))
+    engine.dispose()
+
+
+def read_catalog(engine: Engine) -> dict[str, tuple]:
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text(
+                'SELECT menu.title, menu.submenus_count, menu.dishes_count, submenu.title, dishes.title, dishes.price '
+                'FROM menu JOIN submenu ON submenu.menu_id = menu.id JOIN dishes ON dishes.submenu_id = submenu.id'
+            )
+        )
+        return {row[4]: tuple(row) for row in rows}
+
+
+def test_import_workbook(engine: Engine) -> None:
+    stats = import_catalog(engine, parse_rows(WORKBOOK_ROWS))
+    assert stats.rows == stats.upserted == len(WORKBOOK_ROWS)
+    assert stats.deleted == 0
+    assert stats.tables == {'menu': 2, 'submenu': 3, 'dishes': 4}
+    catalog = read_catalog(engine)
+    assert len(catalog) == 4
+    assert catalog['Import dish 1.1.1'] == ('Import menu 1', 2, 3, 'Import submenu 1.1', 'Import dish 1.1.1', 90)
+    assert catalog['Import dish 1.2.1'][5] == 150
+
+
+def test_reimport_unchanged(engine: Engine) -> None:
+    before = read_catalog(engine)
+    stats = import_catalog(engine, parse_rows(WORKBOOK_ROWS))
+    assert stats.rows == len(WORKBOOK_ROWS)
+    assert (stats.upserted, stats.deleted) == (0, 0)
+    assert not stats.changes
+    assert read_catalog(engine) == before
+
+
+def test_reimport_changed_row(engine: Engine) -> None:
+    stats = import_catalog(engine, parse_rows(CHANGED_ROWS))
+    assert (stats.upserted, stats.deleted) == (1, 0)
+    assert stats.changes.dishes == {(workbook_uuid(1, 1, 2), workbook_uuid(1, 1), workbook_uuid(1))}
+    assert not stats.changes.menus and not stats.changes.submenus
+    assert read_catalog(engine)['Import dish 1.1.2'][5] == 250
+
+
+def test_reimport_removed_submenu(engine: Engine) -> None:
+    stats = import_catalog(engine, parse_rows(REMOVED_ROWS))
+    # The submenu and its dish, nothing else is written.
+    assert (stats.upserted, stats.deleted) == (0, 2)
+    assert stats.changes.deleted_submenus == {workbook_uuid(1, 2)}
+    assert stats.changes.dishes == {(workbook_uuid(1, 2, 1), workbook_uuid(1, 2), workbook_uuid(1))}
+    catalog = read_catalog(engine)
+    assert 'Import dish 1.2.1' not in catalog
+    assert catalog['Import dish 1.1.1'][1:3] == (1, 2)
+
+
+def test_reimport_swapped_titles(engine: Engine) -> None:
+    before = read_catalog(engine)
+    first, second = REMOVED_ROWS[2], REMOVED_ROWS[3]
+    swapped = [*REMOVED_ROWS[:2], (*first[:3], second[3], *first[4:]), (*second[:3], first[3], *second[4:])]
+    stats = import_catalog(engine, parse_rows([*swapped, *REMOVED_ROWS[4:]]))
+    assert (stats.upserted, stats.deleted) == (2, 0)
+    catalog = read_catalog(engine)
+    assert catalog['Import dish 1.1.1'][5] == before['Import dish 1.1.2'][5]
+    assert catalog['Import dish 1.1.2'][5] == before['Import dish 1.1.1'][5]
+
+    import_catalog(engine, parse_rows(REMOVED_ROWS))
+    assert read_catalog(engine) == before
+
+
+@pytest.mark.parametrize(
+    'row, error',
+    [
+        ((None, None, 2, 'Import dish 1.1.1', 'Description', 100, 100), 'duplicate dish titles: Import dish 1.1.1'),
+        ((None, None, 2, 'Import dish 2.1.2', 'Description', '', 100), 'without a numeric price'),
+        ((None, None, 2, 'Import dish 2.1.2', 'Description', 10**9, 100), 'dishes rows refused'),
+    ],
+)
+def test_reimport_rejected(engine: Engine, row: tuple, error: str) -> None:
+    before = read_catalog(engine)
+    with pytest.raises(ImportValidationException, match=error):
+        import_catalog(engine, parse_rows([*REMOVED_ROWS, row]))
+    assert read_catalog(engine) == before
+
+
+def test_import_dish_before_submenu(engine: Engine) -> None:
+    before = read_catalog(engine)
+    with pytest.raises(ImportValidationException, match='dishes without a submenu'):
+        import_catalog(engine, parse_rows([(None, None, 1, 'Import dish', 'Description', 100, 100), *REMOVED_ROWS]))
+    assert read_catalog(engine) == before
+
+
+def test_publish_after_api_delete(engine: Engine) -> None:
+    # A new price for dish 1.1.1, whose submenu is deleted through the API
+    # after the delta was computed.
+    rows = [*REMOVED_ROWS[:2], (None, None, 1, 'Import dish 1.1.1', 'Description', 150, 90), *REMOVED_ROWS[3:]]
+    stats = ImportStats(tables={table.name: 0 for table in TABLES})
+    with engine.connect() as connection:
+        cursor = connection.connection.cursor()
+        with connection.begin():
+            for table in TABLES:
+                cursor.execute(f'CREATE TEMP TABLE {table.staging} (LIKE {table.name} INCLUDING DEFAULTS)')
+            copy_batches(cursor, parse_rows(rows), stats)
+            stage_delta(cursor)
+        with engine.begin() as other:
+            other.execute(text('DELETE FROM submenu WHERE id = :id'), {'id': workbook_uuid(1, 1)})
+        with connection.begin():
+            apply_staged(cursor, stats)
+            for table in TABLES:
+                cursor.execute(f'DROP TABLE {table.staging}, {table.delta}')
+
+    # The submenu and its dishes are written again.
+    assert stats.changes.submenus == {(workbook_uuid(1, 1), workbook_uuid(1))}
+    catalog = read_catalog(engine)
+    assert catalog['Import dish 1.1.1'][1:] == (1, 2, 'Import submenu 1.1', 'Import dish 1.1.1', 135)
+    assert 'Import dish 1.1.2' in catalog
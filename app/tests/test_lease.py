@@ -0,0 +1,87 @@
+import time
+import uuid
+from typing import Iterator
+
+import pytest
+import redis
+
+from app.celery.lease import Lease, LeaseLostException
+from app.config import Config
+
+config = Config()
+TTL = 0.3
+
+
+@pytest.fixture
+def client() -> Iterator[redis.Redis]:
+    client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def key(client: redis.Redis) -> Iterator[str]:
+    key = f'test_lease_{uuid.uuid4().hex}'
+    yield key
+    client.delete(key)
+
+
+def test_lease_heartbeat(client: redis.Redis, key: str) -> None:
+    lease = Lease(client, key, TTL)
+    assert lease.acquire()
+    assert not Lease(client, key, TTL).acquire()
+    # The heartbeat keeps the lease past its TTL.
+    time.sleep(TTL * 3)
+    assert client.get(key) == lease.token.encode()
+    lease.ensure()
+    lease.release()
+    assert client.get(key) is None
+
+
+def test_lease_handover(client: redis.Redis, key: str) -> None:
+    lease = Lease(client, key, TTL)
+    assert lease.acquire()
+    # Stopped but not released: the lease waits for the next holder.
+    lease.stop()
+    heir = Lease(client, key, TTL, lease.token)
+    assert heir.adopt()
+    time.sleep(TTL * 3)
+    assert client.get(key) == lease.token.encode()
+    heir.ensure()
+    heir.release()
+    assert not Lease(client, key, TTL, lease.token).adopt()
+
+
+def test_lease_expiry(client: redis.Redis, key: str) -> None:
+    # A worker that died while holding the lease no longer extends it.
+    client.set(key, 'dead worker', px=int(TTL * 1000))
+    lease = Lease(client, key, TTL)
+    assert not lease.acquire()
+    time.sleep(TTL * 2)
+    assert lease.acquire()
+    lease.release()
+
+
+def test_lease_lost(client: redis.Redis, key: str) -> None:
+    lease = Lease(client, key, TTL)
+    assert lease.acquire()
+    client.set(key, 'another holder')
+    assert lease.lost.wait(TTL * 3)
+    with pytest.raises(LeaseLostException):
+        lease.ensure()
+    # Releasing a lost lease leaves the new holder alone.
+    lease.release()
+    assert client.get(key) == b'another holder'
+
+
+def test_lease_ensure_after_expiry(client: redis.Redis, key: str) -> None:
+    lease = Lease(client, key, TTL)
+    assert lease.acquire()
+    lease.stop()
+    time.sleep(TTL * 2)
+    other = Lease(client, key, TTL)
+    assert other.acquire()
+    # The heartbeat was stopped, so only the key tells that the lease is gone.
+    with pytest.raises(LeaseLostException):
+        lease.ensure()
+    other.release()
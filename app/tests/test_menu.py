@@ -1,8 +1,12 @@
 import pytest
 from httpx import AsyncClient
 from pydantic import UUID4
+from sqlalchemy import update
 
+from app.cache.redis import cache_instance
+from app.database.models import Menu
 from app.routers import menu_router
+from app.tests.conftest import test_session_maker as session_maker
 from app.tests.utils import reverse
 
 TEST_MENU_ID = 'c36c1308-8f73-41df-8a11-6bb2f753ffb7'
@@ -46,6 +50,19 @@ async def test_get_menu_list(client: AsyncClient, menu_id: UUID4) -> None:
     ]
 
 
+@pytest.mark.asyncio
+async def test_get_menu_list_not_modified(client: AsyncClient, menu_id: UUID4) -> None:
+    response = await client.get(reverse(menu_router.get_menu_list))
+    assert response.status_code == 200
+    etag = response.headers['etag']
+    response = await client.get(
+        reverse(menu_router.get_menu_list), headers={'If-None-Match': etag}
+    )
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    assert response.content == b''
+
+
 @pytest.mark.asyncio
 async def test_get_menu(client: AsyncClient, menu_id: UUID4) -> None:
     response = await client.get(reverse(menu_router.get_menu, id=menu_id))
@@ -53,6 +70,10 @@ async def test_get_menu(client: AsyncClient, menu_id: UUID4) -> None:
     menu = response.json()
     assert 'submenus_count' in menu
     assert 'dishes_count' in menu
+    response = await client.get(
+        reverse(menu_router.get_menu, id=menu_id), headers={'If-None-Match': '*'}
+    )
+    assert response.status_code == 304
 
 
 @pytest.mark.asyncio
@@ -69,6 +90,42 @@ async def test_update_menu(client: AsyncClient, menu_id: UUID4) -> None:
     assert 'dishes_count' in menu
 
 
+@pytest.mark.asyncio
+async def test_get_menu_before_invalidation(client: AsyncClient, menu_id: UUID4) -> None:
+    url = reverse(menu_router.get_menu, id=menu_id)
+    response = await client.get(url)
+    assert response.status_code == 200
+    # A write that bumped the versions, but whose invalidation has not run yet.
+    async with session_maker() as session:
+        await session.execute(
+            update(Menu).where(Menu.id == menu_id).values(description='Not invalidated yet')
+        )
+        await session.commit()
+    await cache_instance.bump([f'menu_{menu_id}'])
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.json()['description'] == 'Not invalidated yet'
+    response = await client.get(url, headers={'If-None-Match': response.headers['etag']})
+    assert response.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_get_update_menu_etag_changed(client: AsyncClient, menu_id: UUID4) -> None:
+    response = await client.get(
+        reverse(menu_router.get_menu, id=menu_id), headers={'If-None-Match': '"stale"'}
+    )
+    assert response.status_code == 200
+    etag = response.headers['etag']
+    await client.patch(
+        reverse(menu_router.update_menu, id=menu_id), json=MENU_UPDATE_DATA
+    )
+    response = await client.get(
+        reverse(menu_router.get_menu, id=menu_id), headers={'If-None-Match': etag}
+    )
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+
+
 @pytest.mark.asyncio
 async def test_get_update_menu_list(client: AsyncClient, menu_id: UUID4) -> None:
     response = await client.get(reverse(menu_router.get_menu_list))
@@ -94,3 +151,8 @@ async def test_get_menu_not_exists(client: AsyncClient) -> None:
     response = await client.get(reverse(menu_router.get_menu, id=TEST_MENU_ID))
     assert response.status_code == 404
     assert response.json() == {'detail': 'menu not found'}
+    # '*' only matches a menu that exists.
+    response = await client.get(
+        reverse(menu_router.get_menu, id=TEST_MENU_ID), headers={'If-None-Match': '*'}
+    )
+    assert response.status_code == 404
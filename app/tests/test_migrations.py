@@ -0,0 +1,100 @@
+import uuid
+from collections.abc import AsyncIterator
+
+import pytest
+from sqlalchemy import NullPool, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.database.db import Base
+from app.database.migrations import migrate
+from app.tests.conftest import test_engine, testbase_url
+
+SCHEMA = 'legacy_catalog'
+
+# The schema create_all built before the counters and the indexes existed.
+BASELINE = (
+    'CREATE TABLE menu (id uuid PRIMARY KEY, title varchar, description varchar)',
+    """
+    CREATE TABLE submenu (
+        id uuid PRIMARY KEY,
+        title varchar,
+        description varchar,
+        menu_id uuid REFERENCES menu (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE dishes (
+        id uuid PRIMARY KEY UNIQUE,
+        title varchar UNIQUE,
+        description varchar,
+        price numeric(10, 2) NOT NULL,
+        submenu_id uuid REFERENCES submenu (id) ON DELETE CASCADE
+    )
+    """,
+)
+
+MENU_ID = uuid.uuid4()
+SUBMENU_ID = uuid.uuid4()
+
+
+@pytest.fixture
+async def legacy_engine() -> AsyncIterator[AsyncEngine]:
+    async with test_engine.begin() as conn:
+        await conn.exec_driver_sql(f'CREATE SCHEMA {SCHEMA}')
+    engine = create_async_engine(
+        testbase_url,
+        poolclass=NullPool,
+        connect_args={'server_settings': {'search_path': SCHEMA}},
+    )
+    try:
+        yield engine
+    finally:
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(f'DROP SCHEMA {SCHEMA} CASCADE')
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_migrate_baseline_schema(legacy_engine: AsyncEngine) -> None:
+    async with legacy_engine.begin() as conn:
+        for statement in BASELINE:
+            await conn.exec_driver_sql(statement)
+        await conn.execute(
+            text("INSERT INTO menu VALUES (:id, 'Menu', '')"), {'id': MENU_ID}
+        )
+        await conn.execute(
+            text("INSERT INTO submenu VALUES (:id, 'Submenu', '', :menu_id)"),
+            {'id': SUBMENU_ID, 'menu_id': MENU_ID},
+        )
+        for title in ('First', 'Second'):
+            await conn.execute(
+                text("INSERT INTO dishes VALUES (:id, :title, '', 1.5, :submenu_id)"),
+                {'id': uuid.uuid4(), 'title': title, 'submenu_id': SUBMENU_ID},
+            )
+
+    await migrate(legacy_engine)
+
+    async with legacy_engine.begin() as conn:
+        # Every column of the models exists, whatever commit added it.
+        for table in ('menu', 'submenu', 'dishes'):
+            result = await conn.execute(
+                text(
+                    'SELECT column_name FROM information_schema.columns '
+                    'WHERE table_schema = :schema AND table_name = :table'
+                ),
+                {'schema': SCHEMA, 'table': table},
+            )
+            assert set(result.scalars()) == set(Base.metadata.tables[table].columns.keys())
+        counts = await conn.execute(text('SELECT submenus_count, dishes_count FROM menu'))
+        assert counts.one() == (1, 2)
+        # The triggers keep the backfilled counters up to date.
+        await conn.execute(
+            text("INSERT INTO dishes VALUES (:id, 'Third', '', 1.5, :submenu_id)"),
+            {'id': uuid.uuid4(), 'submenu_id': SUBMENU_ID},
+        )
+        counts = await conn.execute(text('SELECT dishes_count FROM submenu'))
+        assert counts.scalar_one() == 3
+        counts = await conn.execute(text('SELECT dishes_count FROM menu'))
+        assert counts.scalar_one() == 3
+
+    assert await migrate(legacy_engine) == []
@@ -0,0 +1,94 @@
+import base64
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from pydantic import UUID4
+
+from app.cache.redis import cache_instance
+from app.config import Config
+from app.routers import menu_router, submenu_router
+from app.tests.test_menu import MENU_CREATE_DATA
+from app.tests.test_submenu import SUBMENU_CREATE_DATA
+from app.tests.utils import reverse
+
+config = Config()
+
+
+@pytest.mark.asyncio
+async def test_add_submenus(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.post(reverse(menu_router.add_menu), json=MENU_CREATE_DATA)
+    menu_id = response.json()['id']
+    for _ in range(3):
+        response = await client.post(
+            reverse(submenu_router.add_submenu, menu_id=menu_id),
+            json=SUBMENU_CREATE_DATA,
+        )
+        assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_submenu_pages(client: AsyncClient, menu_id: UUID4) -> None:
+    url = reverse(submenu_router.get_submenu_list, menu_id=menu_id)
+    response = await client.get(url, params={'limit': 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    cursor = response.headers['X-Next-Cursor']
+
+    response = await client.get(url, params={'limit': 2, 'cursor': cursor})
+    assert response.status_code == 200
+    second_page = response.json()
+    assert len(second_page) == 1
+    assert 'X-Next-Cursor' not in response.headers
+
+    ids = [submenu['id'] for submenu in first_page + second_page]
+    assert ids == sorted(ids)
+
+    response = await client.get(url, params={'limit': 2, 'cursor': cursor})
+    assert response.json() == second_page
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor(client: AsyncClient, menu_id: UUID4) -> None:
+    response = await client.get(
+        reverse(submenu_router.get_submenu_list, menu_id=menu_id),
+        params={'cursor': 'not a cursor'},
+    )
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'invalid cursor'}
+
+
+@pytest.mark.asyncio
+async def test_cached_pages(client: AsyncClient, menu_id: UUID4, prepare_cache: None) -> None:
+    url = reverse(submenu_router.get_submenu_list, menu_id=menu_id)
+    response = await client.get(url, params={'limit': 2})
+    cursor = response.headers['X-Next-Cursor']
+    last_id = response.json()[-1]['id']
+    # A cursor the server did not issue.
+    unsigned = base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b'=').decode()
+    response = await client.get(url, params={'cursor': unsigned})
+    assert response.status_code == 200
+    assert await cache_instance.redis_client.keys(f'menu_{menu_id}_submenu_page_*') == []
+
+    await client.get(url)
+    response = await client.get(url, params={'cursor': cursor})
+    assert len(response.json()) == 1
+    keys = await cache_instance.redis_client.keys(f'menu_{menu_id}_submenu_page_*')
+    limit = config.PAGE_DEFAULT_LIMIT
+    assert sorted(keys) == sorted(
+        f'menu_{menu_id}_submenu_page_{limit}_{after}'.encode()
+        for after in ('start', last_id)
+    )
+
+
+@pytest.mark.asyncio
+async def test_limit_bounds(client: AsyncClient) -> None:
+    response = await client.get(reverse(menu_router.get_menu_list), params={'limit': 0})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_delete_paged_menu(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.get(reverse(menu_router.get_menu_list))
+    assert response.json() == []
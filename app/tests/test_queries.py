@@ -0,0 +1,80 @@
+import pytest
+from httpx import AsyncClient
+from pydantic import UUID4
+
+from app.routers import dishes_router, menu_router, submenu_router
+from app.tests.test_dish import DISH_CREATE_DATA
+from app.tests.test_menu import MENU_CREATE_DATA
+from app.tests.test_submenu import SUBMENU_CREATE_DATA
+from app.tests.utils import reverse
+
+
+def selects(queries: list[str]) -> list[str]:
+    return [query for query in queries if query.lstrip().upper().startswith('SELECT')]
+
+
+@pytest.mark.asyncio
+async def test_add_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.post(reverse(menu_router.add_menu), json=MENU_CREATE_DATA)
+    menu_id = response.json()['id']
+    response = await client.post(
+        reverse(submenu_router.add_submenu, menu_id=menu_id), json=SUBMENU_CREATE_DATA
+    )
+    submenu_id = response.json()['id']
+    response = await client.post(
+        reverse(dishes_router.add_dish, menu_id=menu_id, submenu_id=submenu_id),
+        json=DISH_CREATE_DATA,
+    )
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_menu_list_single_query(
+    client: AsyncClient, menu_id: UUID4, prepare_cache: None, queries: list[str]
+) -> None:
+    queries.clear()
+    response = await client.get(reverse(menu_router.get_menu_list))
+    assert response.status_code == 200
+    statements = selects(queries)
+    assert len(statements) == 1
+    assert 'submenu' not in statements[0]
+    assert 'dishes' not in statements[0]
+
+
+@pytest.mark.asyncio
+async def test_submenu_list_single_query(
+    client: AsyncClient, menu_id: UUID4, prepare_cache: None, queries: list[str]
+) -> None:
+    queries.clear()
+    response = await client.get(
+        reverse(submenu_router.get_submenu_list, menu_id=menu_id)
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.json()[0]['dishes_count'] == 1
+    statements = selects(queries)
+    assert len(statements) == 1
+    assert 'FROM dishes' not in statements[0]
+
+
+@pytest.mark.asyncio
+async def test_dishes_list_single_query(
+    client: AsyncClient,
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    prepare_cache: None,
+    queries: list[str],
+) -> None:
+    queries.clear()
+    response = await client.get(
+        reverse(dishes_router.get_dishes_list, menu_id=menu_id, submenu_id=submenu_id)
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert len(selects(queries)) == 1
+
+
+@pytest.mark.asyncio
+async def test_delete_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.get(reverse(menu_router.get_menu_list))
+    assert response.json() == []
@@ -0,0 +1,126 @@
+import uuid
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from sqlalchemy import event, text
+
+from app.repository.dishes_repo import DishesRepository
+from app.repository.menu_repo import MenuRepository
+from app.repository.submenu_repo import SubmenuRepositary
+from app.tests.conftest import test_engine
+from app.tests.conftest import test_session_maker as session_maker
+
+MENUS = 2000
+SUBMENUS_PER_MENU = 5
+DISHES_PER_SUBMENU = 2
+
+
+def seq_scans(plan: dict[str, Any]) -> list[str]:
+    found = []
+    if plan['Node Type'] == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+
+@pytest.fixture
+def statements() -> Iterator[list[tuple[str, Any]]]:
+    executed: list[tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            executed.append((statement, parameters))
+
+    event.listen(test_engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    yield executed
+    event.remove(test_engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.mark.asyncio
+async def test_add_large_catalog() -> None:
+    async with test_engine.begin() as conn:
+        await conn.execute(
+            text(
+                """
+                INSERT INTO menu (id, title, description)
+                SELECT gen_random_uuid(), 'large menu ' || n, ''
+                FROM generate_series(1, :menus) AS n
+                """
+            ),
+            {'menus': MENUS},
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO submenu (id, title, description, menu_id)
+                SELECT gen_random_uuid(), 'large submenu ' || n, '', menu.id
+                FROM menu, generate_series(1, :submenus) AS n
+                WHERE menu.title LIKE 'large menu %'
+                """
+            ),
+            {'submenus': SUBMENUS_PER_MENU},
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO dishes (id, title, description, price, submenu_id)
+                SELECT gen_random_uuid(), 'large dish ' || submenu.id || ' ' || n, '', 1.5, submenu.id
+                FROM submenu, generate_series(1, :dishes) AS n
+                WHERE submenu.title LIKE 'large submenu %'
+                """
+            ),
+            {'dishes': DISHES_PER_SUBMENU},
+        )
+        await conn.execute(text('ANALYZE menu, submenu, dishes'))
+
+
+@pytest.mark.asyncio
+async def test_repository_queries_use_indexes(statements: list[tuple[str, Any]]) -> None:
+    async with test_engine.connect() as conn:
+        menu_id, submenu_id, dish_id = (
+            await conn.execute(
+                text(
+                    """
+                    SELECT menu.id, submenu.id, dishes.id
+                    FROM menu JOIN submenu ON submenu.menu_id = menu.id
+                    JOIN dishes ON dishes.submenu_id = submenu.id
+                    WHERE menu.title LIKE 'large menu %' LIMIT 1
+                    """
+                )
+            )
+        ).one()
+    statements.clear()
+    # A cursor in the middle of the id range, so the keyset filter has work to do.
+    after = uuid.UUID(int=2**127)
+
+    menus = MenuRepository(session_maker)
+    submenus = SubmenuRepositary(session_maker)
+    dishes = DishesRepository(session_maker)
+    await menus.get_menu(menu_id)
+    await menus.get_menu_list(100)
+    await menus.get_menu_list(100, after)
+    await menus.get_menu_list_json(100, after)
+    await submenus.get_sub(menu_id, submenu_id)
+    await submenus.get_submenu_list(menu_id, 10)
+    await submenus.get_submenu_list(menu_id, 10, after)
+    await submenus.get_submenu_list_json(menu_id, 10, after)
+    await dishes.get_dish(submenu_id, dish_id)
+    await dishes.get_dishes_list(submenu_id, 10)
+    await dishes.get_dishes_list_json(submenu_id, 10, after)
+    assert statements
+
+    async with test_engine.connect() as conn:
+        for statement, parameters in statements:
+            result = await conn.exec_driver_sql(
+                f'EXPLAIN (FORMAT JSON) {statement}', parameters
+            )
+            plan = result.scalar()[0]['Plan']
+            assert seq_scans(plan) == [], statement
+
+
+@pytest.mark.asyncio
+async def test_delete_large_catalog() -> None:
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM menu WHERE title LIKE 'large menu %'"))
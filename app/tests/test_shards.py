@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from app.celery.parser import read_rows
+from app.celery.shards import open_sheet, plan_shards, read_shard
+
+
+def write_workbook(path: Path, menus: int) -> None:
+    workbook = Workbook()
+    sheet = workbook.active
+    for menu in range(1, menus + 1):
+        sheet.append([menu, f'Menu {menu}', 'Description'])
+        for submenu in range(1, 3):
+            sheet.append([None, submenu, f'Submenu {menu}.{submenu}', 'Description'])
+            for dish in range(1, 4):
+                sheet.append([None, None, dish, f'Dish {menu}.{submenu}.{dish}', 'Description', '12.50', 10])
+    workbook.save(path)
+
+
+def test_shards_read_the_same_rows(tmp_path: Path) -> None:
+    path = tmp_path / 'Menu.xlsx'
+    write_workbook(path, menus=10)
+    sheet = open_sheet(path)
+    shards = plan_shards(sheet, 4)
+    assert len(shards) == 4
+    rows = [row for shard in shards for row in read_shard(sheet, shard)]
+    assert rows == list(read_rows(path))
+    # Every shard starts with a menu row.
+    assert all(next(read_shard(sheet, shard))[0] for shard in shards)
+
+
+def test_admin_workbook() -> None:
+    path = Path('./app/admin/Menu.xlsx')
+    sheet = open_sheet(path)
+    rows = [row for shard in plan_shards(sheet, 2) for row in read_shard(sheet, shard)]
+    expected = list(read_rows(path))
+    assert [row for row in rows if any(row)] == [row for row in expected if any(row)]
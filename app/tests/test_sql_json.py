@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+from pydantic import UUID4
+
+from app.cache.redis import cache_instance
+from app.routers import dishes_router, menu_router, submenu_router
+from app.services import dish, menu, submenu
+from app.tests.test_dish_sub_in_menu import DISH_CREATE_DATA, DISH_CREATE_DATA_SECOND
+from app.tests.test_menu import MENU_CREATE_DATA
+from app.tests.test_submenu import SUBMENU_CREATE_DATA
+from app.tests.utils import reverse
+
+
+def render_in_database(monkeypatch: pytest.MonkeyPatch) -> None:
+    for module in (menu, submenu, dish):
+        monkeypatch.setattr(module.config, 'SQL_JSON_RENDERING', True)
+
+
+async def get_pages(client: AsyncClient, url: str, **params) -> list[tuple]:
+    pages = []
+    cursor = None
+    while True:
+        if cursor is not None:
+            params['cursor'] = cursor
+        response = await client.get(url, params=params)
+        assert response.status_code == 200
+        cursor = response.headers.get('X-Next-Cursor')
+        pages.append((response.json(), cursor))
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_add_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    for _ in range(2):
+        response = await client.post(reverse(menu_router.add_menu), json=MENU_CREATE_DATA)
+        menu_id = response.json()['id']
+        response = await client.post(
+            reverse(submenu_router.add_submenu, menu_id=menu_id), json=SUBMENU_CREATE_DATA
+        )
+    submenu_id = response.json()['id']
+    for data in (DISH_CREATE_DATA, DISH_CREATE_DATA_SECOND):
+        response = await client.post(
+            reverse(dishes_router.add_dish, menu_id=menu_id, submenu_id=submenu_id),
+            json=data,
+        )
+        assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('limit', [1, 100])
+async def test_lists_rendered_in_database(
+    client: AsyncClient, menu_id: UUID4, monkeypatch: pytest.MonkeyPatch, limit: int
+) -> None:
+    urls = [reverse(menu_router.get_menu_list)]
+    for item in (await client.get(urls[0])).json():
+        urls.append(reverse(submenu_router.get_submenu_list, menu_id=item['id']))
+        for sub in (await client.get(urls[-1])).json():
+            urls.append(
+                reverse(dishes_router.get_dishes_list, menu_id=item['id'], submenu_id=sub['id'])
+            )
+    expected = [await get_pages(client, url, limit=limit) for url in urls]
+
+    await cache_instance.flush()
+    render_in_database(monkeypatch)
+    assert [await get_pages(client, url, limit=limit) for url in urls] == expected
+    await cache_instance.flush()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('accept', ['application/json', 'application/x-ndjson'])
+async def test_all_rendered_in_database(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch, accept: str
+) -> None:
+    response = await client.get(reverse(menu_router.get_all_menus))
+    expected = response.json()
+    assert len(expected) == 2
+
+    render_in_database(monkeypatch)
+    response = await client.get(reverse(menu_router.get_all_menus), headers={'Accept': accept})
+    assert response.status_code == 200
+    if accept == 'application/x-ndjson':
+        assert [json.loads(line) for line in response.text.splitlines()] == expected
+    else:
+        assert response.json() == expected
+
+
+@pytest.mark.asyncio
+async def test_delete_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.get(reverse(menu_router.get_menu_list))
+    assert response.json() == []
@@ -0,0 +1,62 @@
+import pytest
+from httpx import AsyncClient
+from pydantic import UUID4
+
+from app.celery import warmup
+from app.config import Config
+from app.routers import dishes_router, menu_router, submenu_router
+from app.tests.conftest import testbase_url
+from app.tests.test_dish import DISH_CREATE_DATA
+from app.tests.test_menu import MENU_CREATE_DATA
+from app.tests.test_queries import selects
+from app.tests.test_submenu import SUBMENU_CREATE_DATA
+from app.tests.utils import reverse
+
+config = Config()
+
+
+@pytest.mark.asyncio
+async def test_add_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.post(reverse(menu_router.add_menu), json=MENU_CREATE_DATA)
+    menu_id = response.json()['id']
+    response = await client.post(
+        reverse(submenu_router.add_submenu, menu_id=menu_id), json=SUBMENU_CREATE_DATA
+    )
+    submenu_id = response.json()['id']
+    response = await client.post(
+        reverse(dishes_router.add_dish, menu_id=menu_id, submenu_id=submenu_id),
+        json=DISH_CREATE_DATA,
+    )
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_warm_cache(
+    client: AsyncClient,
+    menu_id: UUID4,
+    submenu_id: UUID4,
+    prepare_cache: None,
+    queries: list[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(warmup.config, 'ENGINE_URL', testbase_url)
+    # The menu list, the menu, its submenu list and the dish list of its submenu.
+    assert await warmup.warm_cache(2, config.PAGE_DEFAULT_LIMIT) == 4
+
+    queries.clear()
+    urls = [
+        reverse(menu_router.get_menu_list),
+        reverse(menu_router.get_menu, id=menu_id),
+        reverse(submenu_router.get_submenu_list, menu_id=menu_id),
+        reverse(dishes_router.get_dishes_list, menu_id=menu_id, submenu_id=submenu_id),
+    ]
+    for url in urls:
+        response = await client.get(url)
+        assert response.status_code == 200
+    assert selects(queries) == []
+
+
+@pytest.mark.asyncio
+async def test_delete_menu_tree(client: AsyncClient, delete_menus: None) -> None:
+    response = await client.get(reverse(menu_router.get_menu_list))
+    assert response.json() == []
@@ -0,0 +1,51 @@
+import hashlib
+import os
+from pathlib import Path
+
+from app.celery.watcher import ChangeDetector, Inotify
+
+
+def test_change_detector(tmp_path: Path) -> None:
+    path = tmp_path / 'Menu.xlsx'
+    detector = ChangeDetector(path)
+    assert detector.poll() is None
+
+    path.write_bytes(b'first')
+    snapshot = detector.poll()
+    assert snapshot is not None
+    assert snapshot.data == b'first'
+    assert snapshot.hash == hashlib.sha256(b'first').hexdigest()
+    # Not accepted yet, so a failed import is retried on the next poll.
+    assert detector.poll() == snapshot
+    detector.accept(snapshot)
+    assert detector.poll() is None
+    signature = snapshot.signature
+
+    # Same bytes under a new modification time.
+    os.utime(path, ns=(signature.mtime_ns - 10**9, signature.mtime_ns - 10**9))
+    assert detector.poll() is None
+    assert detector.signature != signature
+
+    path.write_bytes(b'second')
+    changed = detector.poll()
+    assert changed is not None
+    assert changed.data == b'second'
+
+
+def test_change_detector_debounce(tmp_path: Path) -> None:
+    path = tmp_path / 'Menu.xlsx'
+    path.write_bytes(b'first')
+    detector = ChangeDetector(path, debounce=60)
+    assert detector.poll() is None
+    os.utime(path, (0, 0))
+    assert detector.poll() is not None
+
+
+def test_inotify(tmp_path: Path) -> None:
+    inotify = Inotify(tmp_path)
+    try:
+        assert inotify.read(0) == []
+        (tmp_path / 'Menu.xlsx').write_bytes(b'first')
+        assert 'Menu.xlsx' in inotify.read(1)
+    finally:
+        inotify.close()